@@ -1,6 +1,10 @@
 #!/bin/bash
 
 # Simple script to clear the events.log file
+#
+# Only run this while the dashboard server is stopped. A running server
+# rotates events.log into events.log.NNNNNN segments by itself (see
+# LOG_SEGMENT_MAX_BYTES in the server script).
 
 LOG_FILE="events.log"
 BACKUP_DIR="log_backups"
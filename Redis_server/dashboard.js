@@ -11,7 +11,59 @@
     let maxReconnectInterval = 30000; // Maximum wait time
     let reconnectAttempts = 0;
     let reconnectTimer = null;
-    let autoRefreshTimer = null;
+
+    // Sequence number of the newest event on the page, rendered by the server.
+    // New events are pushed as JSON deltas; on (re)connect we ask only for
+    // events after this one instead of reloading the whole page.
+    let lastSeq = parseInt(document.body.dataset.lastSeq, 10) || 0;
+
+    // Only the first page shows live events; older pages (reached through
+    // "Load older events") and search results are a fixed view of the past
+    const pageParams = new URLSearchParams(window.location.search);
+    const isFirstPage = !pageParams.has('cursor') && !pageParams.get('q');
+
+    // Filters from the URL (repeated or comma-separated values), applied to
+    // pushed events the same way the server applies them to the page
+    const filterParams = ['client_id', 'client_name', 'priority', 'type'];
+    const activeFilters = {};
+    filterParams.forEach(function(param) {
+        const values = [];
+        pageParams.getAll(param).forEach(function(raw) {
+            raw.split(',').forEach(function(value) {
+                value = value.trim();
+                if (value) {
+                    values.push(param === 'priority' ? value.toLowerCase() : value);
+                }
+            });
+        });
+        if (values.length) {
+            activeFilters[param] = values;
+        }
+    });
+
+    function eventField(eventData, param) {
+        let value = null;
+        if (param === 'type') {
+            value = eventData.event_info ? eventData.event_info.type : null;
+        } else {
+            value = eventData[param];
+        }
+        if (value === undefined || value === null) {
+            return null;
+        }
+        value = String(value);
+        return param === 'priority' ? value.toLowerCase() : value;
+    }
+
+    function matchesFilters(eventData) {
+        return Object.keys(activeFilters).every(function(param) {
+            return eventData && activeFilters[param].includes(eventField(eventData, param));
+        });
+    }
+
+    // Keep the DOM bounded: beyond this many cards the oldest ones are
+    // dropped and become reachable through "Load older events" instead
+    const maxCards = 500;
 
     // Add connection status indicator to the page
     function createStatusIndicator() {
@@ -32,18 +84,88 @@
         }
     }
 
-    function setupAutoRefresh() {
-        // Clear any existing timer
-        if (autoRefreshTimer) {
-            clearTimeout(autoRefreshTimer);
+    function updateEventCount() {
+        const countDiv = document.querySelector('.event-count');
+        if (!countDiv) {
+            return;
         }
-        
-        // Set a new timer for 15 seconds - fallback refresh
-        console.log("Setting up 15s automatic refresh timer");
-        autoRefreshTimer = setTimeout(function() {
-            console.log("Auto-refresh timer triggered - reloading page");
-            window.location.reload();
-        }, 15000);
+        const shown = document.querySelectorAll('.event-list .event-card').length;
+        countDiv.textContent = `${shown} Event(s) Displayed`;
+    }
+
+    function trimOldCards(eventList) {
+        const cards = eventList.querySelectorAll('.event-card');
+        if (cards.length <= maxCards) {
+            return;
+        }
+        for (let i = maxCards; i < cards.length; i++) {
+            cards[i].remove();
+        }
+
+        // Point "Load older events" just past the oldest card still shown
+        const lastCursor = cards[maxCards - 1].dataset.cursor;
+        if (!lastCursor) {
+            return;
+        }
+        // Keep show_since and the filters, replace the cursor
+        const params = new URLSearchParams(pageParams);
+        params.set('cursor', lastCursor);
+        let link = document.querySelector('.load-older-btn');
+        if (!link) {
+            const pagination = document.createElement('div');
+            pagination.className = 'pagination';
+            link = document.createElement('a');
+            link.className = 'load-older-btn';
+            link.textContent = 'Load older events';
+            pagination.appendChild(link);
+            eventList.insertAdjacentElement('afterend', pagination);
+        }
+        link.href = `/?${params.toString()}`;
+    }
+
+    function prependEvents(events) {
+        const eventList = document.querySelector('.event-list');
+        if (!eventList) {
+            return;
+        }
+
+        // Oldest first, so the newest card ends up on top
+        events.sort(function(a, b) { return a.seq - b.seq; });
+
+        let added = 0;
+        events.forEach(function(item) {
+            if (item.seq <= lastSeq || eventList.querySelector(`[data-seq="${item.seq}"]`)) {
+                return; // Already on the page
+            }
+            if (!matchesFilters(item.event)) {
+                lastSeq = Math.max(lastSeq, item.seq);
+                return; // Filtered out of this view
+            }
+            const placeholder = eventList.querySelector('.no-events');
+            if (placeholder) {
+                placeholder.remove();
+            }
+            eventList.insertAdjacentHTML('afterbegin', item.html);
+            lastSeq = Math.max(lastSeq, item.seq);
+            added++;
+        });
+
+        if (added) {
+            console.log(`Added ${added} new event(s), last seq is now ${lastSeq}`);
+            trimOldCards(eventList);
+            updateEventCount();
+        }
+    }
+
+    function seqWentBack(message) {
+        // A push can repeat events a resume reply already delivered, so only
+        // a lower last_seq carrying no card we have counts as going back
+        if (typeof message.last_seq !== 'number' || message.last_seq >= lastSeq) {
+            return false;
+        }
+        return !(message.events || []).some(function(item) {
+            return document.querySelector(`.event-list [data-seq="${item.seq}"]`);
+        });
     }
 
     function connectWebSocket() {
@@ -75,30 +197,49 @@
                 reconnectAttempts = 0;
                 reconnectInterval = 5000;
                 
-                // Send a ping to confirm connection is working
+                // Send a ping to confirm connection is working, then ask
+                // for anything logged since the newest event we have
                 try {
                     socket.send("ping");
-                    console.log("Sent ping to confirm connection");
+                    if (isFirstPage) {
+                        socket.send(JSON.stringify({ type: "resume", after_seq: lastSeq }));
+                        console.log(`Sent ping and resume request after seq ${lastSeq}`);
+                    }
                 } catch (err) {
                     console.warn("Could not send ping:", err);
                 }
-                
-                // Setup the auto-refresh fallback
-                setupAutoRefresh();
             };
 
             socket.onmessage = function(event) {
                 console.log("Message received from server:", event.data);
                 
-                // Check if the server sent the refresh signal
-                if (event.data === "refresh") {
-                    console.log("Refresh signal received - reloading page");
-                    
-                    // Clear the auto-refresh timer before reloading
-                    if (autoRefreshTimer) {
-                        clearTimeout(autoRefreshTimer);
-                        autoRefreshTimer = null;
-                    }
+                let message = null;
+                try {
+                    message = JSON.parse(event.data);
+                } catch (err) {
+                    // Plain-text messages ("pong", or a bare "refresh" from older servers)
+                    message = { type: event.data };
+                }
+                
+                if (!isFirstPage) {
+                    // Older pages don't change when new events arrive
+                    return;
+                }
+                
+                if (message && message.type === "events" && seqWentBack(message)) {
+                    // The server's log was reset and numbers events from 1
+                    // again, so lastSeq no longer means anything: resync
+                    console.log(`Server last seq ${message.last_seq} is behind ours (${lastSeq}) - reloading page`);
+                    setTimeout(function() {
+                        window.location.reload();
+                    }, 200);
+                } else if (message && message.type === "events") {
+                    // New events pushed by the server: add their cards in place
+                    prependEvents(message.events || []);
+                } else if (message && (message.type === "refresh" || message.type === "resync")) {
+                    // Too many events to push, or the ones we missed are gone:
+                    // fall back to reloading the page
+                    console.log(`${message.type} signal received - reloading page`);
                     
                     // Add a small delay to ensure server has fully processed the event
                     setTimeout(function() {
@@ -152,8 +293,5 @@
 
     // Initial connection attempt
     connectWebSocket();
-    
-    // Setup initial auto-refresh timer
-    setupAutoRefresh();
 
 })(); // Immediately Invoked Function Expression (IIFE) to keep scope clean
\ No newline at end of file
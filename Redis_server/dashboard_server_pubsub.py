@@ -1,38 +1,67 @@
 import json
-import time
+import random
+import socket
 import redis
+import redis.asyncio as aioredis
 import threading
 import asyncio
 import websockets
 import os
 import shutil
-from datetime import datetime, timezone
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import glob
+from collections import deque
 from pathlib import Path
-from urllib.parse import urlparse, parse_qs, quote
 
 # Import custom modules
 from template_handler import TemplateHandler
 from event_manager import EventManager
-from websocket_handler import start_websocket_server, schedule_broadcast, connected_clients
+from sqlite_event_manager import SQLiteEventManager
+from http_handler import DashboardHTTPRequestHandler, PooledHTTPServer
+from static_cache import StaticAssetCache
+from websocket_handler import start_websocket_server, queue_broadcast, connected_clients
 
 #-------------------
 # CONFIGURATION
 #-------------------
 # Redis connection settings
-# REDIS_HOST = 'localhost'  # Use if Redis is local (or brokers ip)
+REDIS_HOST = 'localhost'  # Use if Redis is local (or brokers ip)
 REDIS_PORT = 6379
+INGEST_MODE = "pubsub"  # "pubsub" (misses events sent while the server is down) or "stream"
 REDIS_CHANNEL = 'monitoring:notifications'  # Channel to subscribe to
+EVENT_STREAM = 'monitoring:events'  # Stream clients XADD to when they use NOTIFICATION_MODE = "stream"
+STREAM_GROUP = 'dashboard'  # Consumer group shared by all dashboard server replicas
+STREAM_CONSUMER = socket.gethostname()  # Must be unique per replica within the group
+STREAM_READ_COUNT = 500  # Max entries per XREADGROUP
+STREAM_BLOCK_MS = 5000  # Milliseconds XREADGROUP waits for new entries
+STREAM_CLAIM_IDLE_MS = 60000  # Take over entries another replica left unacknowledged this long
+REDIS_RECONNECT_MIN_DELAY = 1   # Seconds before the first reconnect attempt
+REDIS_RECONNECT_MAX_DELAY = 60  # Reconnect delay doubles up to this many seconds
+INGEST_QUEUE_SIZE = 10000  # Messages buffered between the Redis reader and the event store
+INGEST_BATCH_SIZE = 500    # Max messages handed to the event store per batch
 
 # Server settings
 HTTP_HOST = '0.0.0.0'
 HTTP_PORT = 8000
+HTTP_MAX_CONCURRENT_REQUESTS = 32  # HTTP requests served at the same time (idle keep-alive connections don't count)
+STATIC_CACHE_MAX_AGE = 60  # Seconds browsers may reuse static files before revalidating
+HTTP_GZIP_MIN_SIZE = 1024  # Gzip dashboard/API responses at least this many bytes
 WEBSOCKET_HOST = '0.0.0.0'
 WEBSOCKET_PORT = 8001  # Use a different port for WebSockets
+BROADCAST_WINDOW = 0.25  # Seconds; refreshes within this window are coalesced into one push
+DASHBOARD_PAGE_SIZE = 100  # Event cards per dashboard page ("Load older events" for more)
 
 # Static folder settings
 STATIC_FOLDER = "static"
 LOG_FILE = "events.log"
+LOG_FSYNC_POLICY = "none"  # "none", "batch" (fsync every write batch) or "interval"
+LOG_SEGMENT_MAX_BYTES = 64 * 1024 * 1024  # Seal events.log as events.log.NNNNNN at this size
+LOG_SEGMENT_MAX_AGE = None  # ...or after this many seconds (None to disable)
+LOG_COMPRESS_SEGMENTS = True  # Gzip sealed segments
+EVENT_STORE = "log"  # "log" (events.log segments) or "sqlite"
+SQLITE_DB_FILE = "events.db"  # Used when EVENT_STORE is "sqlite" (see import_events.py)
+SEARCH_ENABLED = True  # Full-text search index in events.log.search (sqlite store searches without one)
+SEARCH_BACKUP_FILES = "log_backups/*.bak"  # Glob of older logs to make searchable too
+SEARCH_MAX_EVENTS = 2000000  # Newest events kept searchable (older ones drop out of the index)
 
 #-------------------
 # GLOBAL VARIABLES
@@ -41,105 +70,6 @@ LOG_FILE = "events.log"
 websocket_loop = None
 # The connected_clients set is now imported from websocket_handler
 
-#-------------------
-# HTTP SERVER
-#-------------------
-class DashboardHTTPRequestHandler(BaseHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.template_handler = TemplateHandler(STATIC_FOLDER)
-        self.event_manager = EventManager(LOG_FILE)
-        super().__init__(*args, **kwargs)
-        
-    def do_GET(self):
-        start_time = time.time()
-        parsed_path = urlparse(self.path)
-        
-        # Handle static file requests
-        if parsed_path.path.startswith('/static/'):
-            self.serve_static_file(parsed_path.path[8:])  
-            return
-            
-        # Handle other known static files
-        if parsed_path.path == '/dashboard.js':
-            self.serve_static_file('dashboard.js')
-            return
-        if parsed_path.path == '/styles.css':
-            self.serve_static_file('styles.css')
-            return
-        
-        # Handle the main dashboard request
-        if parsed_path.path == '/' or parsed_path.path == '/index.html':
-            query_params = parse_qs(parsed_path.query)
-            
-            # Process filtering logic
-            show_since_str = query_params.get('show_since', [None])[0]
-            show_since_dt = None
-            
-            if show_since_str:
-                try:
-                    show_since_str = show_since_str.replace('Z', '+00:00')
-                    show_since_dt = datetime.fromisoformat(show_since_str)
-                    if show_since_dt.tzinfo is None:
-                        show_since_dt = show_since_dt.astimezone(timezone.utc)
-                    print(f"Filtering events since: {show_since_dt}")
-                except ValueError:
-                    print(f"Warning: Invalid 'show_since' timestamp format: {show_since_str}. Showing all events.")
-                    show_since_dt = None
-            
-            # Get filtered events
-            events = self.event_manager.get_events(show_since_dt)
-            
-            # Generate HTML response
-            html_content = self.template_handler.render_dashboard(events, show_since_dt)
-            
-            # Send response
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(html_content.encode('utf-8'))
-            
-            end_time = time.time()
-            print(f"HTTP Request processed in {end_time - start_time:.4f} seconds. Displayed {len(events)} events.")
-            return
-            
-        # If path not recognized, return 404
-        self.send_error(404)
-    
-    def serve_static_file(self, filename):
-        """Serve a static file from the static folder."""
-        file_path = os.path.join(STATIC_FOLDER, filename)
-        
-        if not os.path.exists(file_path):
-            self.send_error(404, f"File not found: {filename}")
-            return
-            
-        # Determine content type based on file extension
-        ext = os.path.splitext(filename)[1].lower()
-        content_type = {
-            '.html': 'text/html',
-            '.css': 'text/css',
-            '.js': 'application/javascript',
-            '.json': 'application/json',
-            '.png': 'image/png',
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.gif': 'image/gif',
-            '.svg': 'image/svg+xml',
-        }.get(ext, 'application/octet-stream')
-        
-        try:
-            with open(file_path, 'rb') as f:
-                content = f.read()
-                
-            self.send_response(200)
-            self.send_header('Content-type', content_type)
-            self.send_header('Content-length', str(len(content)))
-            self.end_headers()
-            self.wfile.write(content)
-        except Exception as e:
-            self.send_error(500, f"Error serving file: {str(e)}")
-
-
 #-------------------
 # WEBSOCKET SERVER
 #-------------------
@@ -150,55 +80,198 @@ class DashboardHTTPRequestHandler(BaseHTTPRequestHandler):
 #-------------------
 # REDIS SUBSCRIBER
 #-------------------
-def redis_subscriber():
-    """Listens to Redis Pub/Sub and appends messages to the log file."""
-    event_manager = EventManager(LOG_FILE)
-    
-    print(f"Attempting to connect to Redis at {REDIS_HOST}:{REDIS_PORT} for Pub/Sub...")
+# Ingestion runs on the WebSocket event loop as a two-stage pipeline:
+# redis_subscriber reads Pub/Sub messages into a bounded queue, and
+# persist_events logs them in batches on a worker thread and queues the
+# logged events for broadcast. When the store falls behind the queue fills
+# up and the subscriber stops reading, so Redis buffers the backlog.
+
+async def redis_subscriber(ingest_queue):
+    """Listens to Redis Pub/Sub and queues the raw messages for persist_events."""
+    delay = REDIS_RECONNECT_MIN_DELAY
     while True:  # Keep trying to connect
+        redis_client = None
+        pubsub = None
+        print(f"Attempting to connect to Redis at {REDIS_HOST}:{REDIS_PORT} for Pub/Sub...")
         try:
-            redis_client = redis.Redis(
+            redis_client = aioredis.Redis(
                 host=REDIS_HOST, port=REDIS_PORT,
                 socket_connect_timeout=10, socket_timeout=None,
                 decode_responses=True
             )
-            redis_client.ping()
+            await redis_client.ping()
             print(f"Successfully connected to Redis for Pub/Sub.")
             pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
-            pubsub.subscribe(REDIS_CHANNEL)
+            await pubsub.subscribe(REDIS_CHANNEL)
             print(f"Subscribed to Redis channel: {REDIS_CHANNEL}")
             print("Waiting for messages to log...")
+            delay = REDIS_RECONNECT_MIN_DELAY
 
-            for message in pubsub.listen():
+            async for message in pubsub.listen():
                 if message['type'] == 'message':
-                    json_data = message['data']
-                    try:
-                        # Parse JSON to get message info for logging
-                        parsed_data = json.loads(json_data)
-                        event_msg = parsed_data.get('message', 'Unknown message')
-                        
-                        # Log the event
-                        if event_manager.log_event(json_data):
-                            print(f"Logged event: {event_msg}")
-                            
-                            # Trigger WebSocket broadcast for real-time updates
-                            schedule_broadcast()
-                        else:
-                            print(f"Failed to log event: {event_msg}")
-                            
-                    except json.JSONDecodeError:
-                        print(f"Invalid JSON received: {json_data[:200]}...")
-                    except Exception as e:
-                        print(f"Error processing message: {e} | Data: {json_data[:200]}...")
+                    # Waits while the queue is full (backpressure)
+                    await ingest_queue.put((None, message['data']))
+
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis connection error in subscriber: {e}")
+        except Exception as e:
+            print(f"Unexpected error in Redis subscriber: {e}")
+        finally:
+            try:
+                if pubsub is not None:
+                    await pubsub.aclose()
+                if redis_client is not None:
+                    await redis_client.aclose()
+            except Exception:
+                pass
+
+        # Exponential backoff, with jitter so several servers don't reconnect in lockstep
+        wait = delay * random.uniform(0.5, 1.0)
+        print(f"Will attempt to reconnect in {wait:.1f} seconds...")
+        await asyncio.sleep(wait)
+        delay = min(delay * 2, REDIS_RECONNECT_MAX_DELAY)
+
+async def redis_stream_consumer(ingest_queue, redis_client):
+    """
+    Reads EVENT_STREAM as STREAM_CONSUMER in STREAM_GROUP and queues the
+    entries for persist_events, which acknowledges them. Entries this
+    consumer read before a restart but never acknowledged are read again
+    first, and entries stuck with a dead replica are claimed.
+    """
+    delay = REDIS_RECONNECT_MIN_DELAY
+    while True:  # Keep trying to connect
+        print(f"Attempting to connect to Redis at {REDIS_HOST}:{REDIS_PORT} for stream {EVENT_STREAM}...")
+        try:
+            await redis_client.ping()
+            try:
+                await redis_client.xgroup_create(EVENT_STREAM, STREAM_GROUP, id='0', mkstream=True)
+                print(f"Created consumer group '{STREAM_GROUP}' on stream {EVENT_STREAM}")
+            except redis.exceptions.ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise
+            print(f"Reading stream {EVENT_STREAM} as '{STREAM_CONSUMER}' in group '{STREAM_GROUP}'")
+            delay = REDIS_RECONNECT_MIN_DELAY
+
+            # '0' re-reads our own pending entries; '>' reads new ones
+            read_id = '0'
+            next_claim = 0.0
+            loop = asyncio.get_running_loop()
+            while True:
+                entries = []
+                if loop.time() >= next_claim:
+                    next_claim = loop.time() + STREAM_CLAIM_IDLE_MS / 1000
+                    claimed = await redis_client.xautoclaim(
+                        EVENT_STREAM, STREAM_GROUP, STREAM_CONSUMER,
+                        min_idle_time=STREAM_CLAIM_IDLE_MS, count=STREAM_READ_COUNT
+                    )
+                    entries.extend(claimed[1])
+
+                response = await redis_client.xreadgroup(
+                    STREAM_GROUP, STREAM_CONSUMER, {EVENT_STREAM: read_id},
+                    count=STREAM_READ_COUNT, block=STREAM_BLOCK_MS if read_id == '>' else None
+                )
+                stream_entries = response[0][1] if response else []
+                if read_id != '>':
+                    # Continue through the pending entries, then switch to new ones
+                    if stream_entries:
+                        print(f"Re-reading {len(stream_entries)} unacknowledged stream entries")
+                        read_id = stream_entries[-1][0]
+                    else:
+                        read_id = '>'
+                entries.extend(stream_entries)
+
+                for entry_id, fields in entries:
+                    if fields is None:
+                        # Trimmed from the stream before it was acknowledged
+                        continue
+                    # Waits while the queue is full (backpressure)
+                    await ingest_queue.put((entry_id, fields.get('data', '')))
 
         except redis.exceptions.ConnectionError as e:
-            print(f"Redis connection error in subscriber thread: {e}")
-            print("Will attempt to reconnect in 15 seconds...")
-            time.sleep(15)
+            print(f"Redis connection error in stream consumer: {e}")
         except Exception as e:
-            print(f"Unexpected error in Redis subscriber thread: {e}")
-            print("Restarting subscription attempt in 15 seconds...")
-            time.sleep(15)
+            print(f"Unexpected error in Redis stream consumer: {e}")
+
+        # Exponential backoff, with jitter so several servers don't reconnect in lockstep
+        wait = delay * random.uniform(0.5, 1.0)
+        print(f"Will attempt to reconnect in {wait:.1f} seconds...")
+        await asyncio.sleep(wait)
+        delay = min(delay * 2, REDIS_RECONNECT_MAX_DELAY)
+
+def log_messages(event_manager, messages, flush=False):
+    """
+    Log a batch of raw JSON messages. With flush=True, wait until they are
+    written out before returning.
+
+    Returns:
+        Tuple of (events that were logged, whether they were written out)
+    """
+    logged_events = []
+    for json_data in messages:
+        try:
+            # Parse JSON to get message info for logging
+            parsed_data = json.loads(json_data)
+            event_msg = parsed_data.get('message', 'Unknown message')
+
+            # Log the event
+            logged_event = event_manager.log_event(parsed_data)
+            if logged_event:
+                print(f"Logged event: {event_msg}")
+                logged_events.append(logged_event)
+            else:
+                print(f"Failed to log event: {event_msg}")
+
+        except json.JSONDecodeError:
+            print(f"Invalid JSON received: {json_data[:200]}...")
+        except Exception as e:
+            print(f"Error processing message: {e} | Data: {json_data[:200]}...")
+    written = event_manager.flush() if flush else True
+    return logged_events, written
+
+async def persist_events(ingest_queue, event_manager, redis_client=None):
+    """
+    Logs queued (stream entry ID or None, message) pairs in batches off the
+    event loop, then pushes them to dashboards. Stream entries are
+    acknowledged with one XACK per batch once they are written out.
+    """
+    unacked = []
+    # Stream entries logged recently, so redelivered ones aren't logged twice
+    seen_ids = set()
+    seen_order = deque()
+    while True:
+        batch = [await ingest_queue.get()]
+        while len(batch) < INGEST_BATCH_SIZE and not ingest_queue.empty():
+            batch.append(ingest_queue.get_nowait())
+
+        messages = []
+        entry_ids = []
+        for entry_id, json_data in batch:
+            if entry_id is not None:
+                entry_ids.append(entry_id)
+                if entry_id in seen_ids:
+                    continue
+                seen_ids.add(entry_id)
+                seen_order.append(entry_id)
+            messages.append(json_data)
+        while len(seen_order) > INGEST_QUEUE_SIZE:
+            seen_ids.discard(seen_order.popleft())
+
+        # log_event can block on a full writer queue, so keep it off the loop
+        logged_events, written = await asyncio.to_thread(log_messages, event_manager, messages, bool(entry_ids))
+
+        # Push the new events to dashboards over WebSocket
+        queue_broadcast(logged_events)
+
+        if entry_ids and not written:
+            # Left pending in the group, so they are read again on restart
+            print(f"Not acknowledging {len(entry_ids)} stream entries: writing them to the log failed.")
+        elif entry_ids:
+            unacked.extend(entry_ids)
+            try:
+                await redis_client.xack(EVENT_STREAM, STREAM_GROUP, *unacked)
+                unacked = []
+            except redis.exceptions.RedisError as e:
+                print(f"Could not acknowledge {len(unacked)} stream entries: {e}. Will retry.")
 
 
 #-------------------
@@ -231,7 +304,7 @@ def setup_static_folder():
     
     print(f"Static folder setup completed: {STATIC_FOLDER}")
 
-async def start_main_websocket_server():
+async def start_main_websocket_server(event_manager, template_handler):
     """Starts the WebSocket server using the compatibility layer."""
     global websocket_loop
     websocket_loop = asyncio.get_running_loop()
@@ -240,18 +313,30 @@ async def start_main_websocket_server():
     server = await start_websocket_server(
         WEBSOCKET_HOST, 
         WEBSOCKET_PORT,
-        websocket_loop
+        websocket_loop,
+        window=BROADCAST_WINDOW,
+        event_renderer=template_handler.render_event_card,
+        event_source=event_manager.get_events_after_seq
     )
     
     # Keep the server running
     await asyncio.Future()
 
-def start_http_server():
-    """Starts the HTTP server in a separate thread."""
+def start_http_server(event_manager, template_handler):
+    """Starts the HTTP server in a separate thread, serving from the shared services."""
     server_address = (HTTP_HOST, HTTP_PORT)
-    httpd = HTTPServer(server_address, DashboardHTTPRequestHandler)
+    static_assets = StaticAssetCache(STATIC_FOLDER, max_age=STATIC_CACHE_MAX_AGE)
+    static_assets.preload()
+    DashboardHTTPRequestHandler.configure(
+        event_manager, template_handler, static_assets,
+        static_folder=STATIC_FOLDER, page_size=DASHBOARD_PAGE_SIZE,
+        gzip_min_size=HTTP_GZIP_MIN_SIZE
+    )
+    httpd = PooledHTTPServer(server_address, DashboardHTTPRequestHandler,
+                             max_workers=HTTP_MAX_CONCURRENT_REQUESTS)
     print(f"Starting HTTP server on http://{HTTP_HOST}:{HTTP_PORT}")
     print(f"Serving dashboard, reading events from: {LOG_FILE}")
+    print(f"Handling up to {HTTP_MAX_CONCURRENT_REQUESTS} requests concurrently")
     http_thread = threading.Thread(target=httpd.serve_forever, daemon=True)
     http_thread.start()
     return httpd, http_thread
@@ -267,15 +352,45 @@ async def main_async():
     except IOError as e:
         print(f"Warning: Could not touch log file '{LOG_FILE}': {e}")
 
-    # Start Redis subscriber in a separate thread
-    subscriber_thread = threading.Thread(target=redis_subscriber, daemon=True)
-    subscriber_thread.start()
+    # Created once and shared by Redis ingestion, the HTTP handler and the WebSocket server
+    if EVENT_STORE == "sqlite":
+        print(f"Storing events in SQLite database: {SQLITE_DB_FILE}")
+        event_manager = SQLiteEventManager(SQLITE_DB_FILE, fsync_policy=LOG_FSYNC_POLICY)
+    else:
+        event_manager = EventManager(
+            LOG_FILE, fsync_policy=LOG_FSYNC_POLICY,
+            segment_max_bytes=LOG_SEGMENT_MAX_BYTES, segment_max_age=LOG_SEGMENT_MAX_AGE,
+            compress_segments=LOG_COMPRESS_SEGMENTS,
+            search=SEARCH_ENABLED, search_extra_files=sorted(glob.glob(SEARCH_BACKUP_FILES)),
+            search_max_events=SEARCH_MAX_EVENTS
+        )
+    template_handler = TemplateHandler(STATIC_FOLDER)
 
     # Start HTTP server in its own thread
-    httpd, http_thread = start_http_server()
+    httpd, http_thread = start_http_server(event_manager, template_handler)
 
     # Start WebSocket server (runs in the current async context)
-    websocket_server_task = asyncio.create_task(start_main_websocket_server())
+    websocket_server_task = asyncio.create_task(
+        start_main_websocket_server(event_manager, template_handler)
+    )
+
+    # Start Redis ingestion on the same event loop
+    ingest_queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+    if INGEST_MODE == "stream":
+        stream_client = aioredis.Redis(
+            host=REDIS_HOST, port=REDIS_PORT,
+            socket_connect_timeout=10, socket_timeout=None,
+            decode_responses=True
+        )
+        ingest_tasks = [
+            asyncio.create_task(redis_stream_consumer(ingest_queue, stream_client)),
+            asyncio.create_task(persist_events(ingest_queue, event_manager, stream_client)),
+        ]
+    else:
+        ingest_tasks = [
+            asyncio.create_task(redis_subscriber(ingest_queue)),
+            asyncio.create_task(persist_events(ingest_queue, event_manager)),
+        ]
 
     # Keep main process alive and handle shutdown
     try:
@@ -284,10 +399,12 @@ async def main_async():
         print("WebSocket server task cancelled.")
     finally:
         print("\nShutting down servers...")
+        for task in ingest_tasks:
+            task.cancel()
         httpd.shutdown()  # Signal HTTP server to stop
         http_thread.join(timeout=2)  # Wait briefly for HTTP thread
         print("HTTP server stopped.")
-        # Subscriber thread is daemon, will exit automatically
+        event_manager.close()  # Write out any queued events
         # WebSocket server stops when task is cancelled
         print("All servers shut down.")
 
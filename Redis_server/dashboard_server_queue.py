@@ -7,14 +7,15 @@ import asyncio
 import websockets
 import os
 import shutil
-from datetime import datetime, timezone
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import glob
 from pathlib import Path
-from urllib.parse import urlparse, parse_qs, quote
 
 # Import custom modules
 from template_handler import TemplateHandler
 from event_manager import EventManager
+from sqlite_event_manager import SQLiteEventManager
+from http_handler import DashboardHTTPRequestHandler, PooledHTTPServer
+from static_cache import StaticAssetCache
 from websocket_handler import start_websocket_server, schedule_broadcast, connected_clients
 
 #-------------------
@@ -25,18 +26,32 @@ REDIS_HOST = 'localhost'  # Use if Redis is local (or brokers ip)
 REDIS_PORT = 6379
 HIGH_PRIORITY_QUEUE = 'monitoring:high'  # High priority queue
 LOW_PRIORITY_QUEUE = 'monitoring:low'    # Low priority queue
-# QUEUE_CHECK_INTERVAL = 1.0  # Seconds between queue checks
-QUEUE_CHECK_INTERVAL = 0.5  # Seconds between queue checks
+QUEUE_BATCH_SIZE = 100     # Max messages popped from a queue per round trip
+QUEUE_BLOCK_TIMEOUT = 5    # Seconds BRPOP blocks on empty queues before re-checking
 
 # Server settings
 HTTP_HOST = '0.0.0.0'
 HTTP_PORT = 8000
+HTTP_MAX_CONCURRENT_REQUESTS = 32  # HTTP requests served at the same time (idle keep-alive connections don't count)
+STATIC_CACHE_MAX_AGE = 60  # Seconds browsers may reuse static files before revalidating
+HTTP_GZIP_MIN_SIZE = 1024  # Gzip dashboard/API responses at least this many bytes
 WEBSOCKET_HOST = '0.0.0.0'
 WEBSOCKET_PORT = 8001  # Use a different port for WebSockets
+BROADCAST_WINDOW = 0.25  # Seconds; refreshes within this window are coalesced into one push
+DASHBOARD_PAGE_SIZE = 100  # Event cards per dashboard page ("Load older events" for more)
 
 # Static folder settings
 STATIC_FOLDER = "static"
 LOG_FILE = "events.log"
+LOG_FSYNC_POLICY = "none"  # "none", "batch" (fsync every write batch) or "interval"
+LOG_SEGMENT_MAX_BYTES = 64 * 1024 * 1024  # Seal events.log as events.log.NNNNNN at this size
+LOG_SEGMENT_MAX_AGE = None  # ...or after this many seconds (None to disable)
+LOG_COMPRESS_SEGMENTS = True  # Gzip sealed segments
+EVENT_STORE = "log"  # "log" (events.log segments) or "sqlite"
+SQLITE_DB_FILE = "events.db"  # Used when EVENT_STORE is "sqlite" (see import_events.py)
+SEARCH_ENABLED = True  # Full-text search index in events.log.search (sqlite store searches without one)
+SEARCH_BACKUP_FILES = "log_backups/*.bak"  # Glob of older logs to make searchable too
+SEARCH_MAX_EVENTS = 2000000  # Newest events kept searchable (older ones drop out of the index)
 
 #-------------------
 # GLOBAL VARIABLES
@@ -45,112 +60,11 @@ LOG_FILE = "events.log"
 websocket_loop = None
 # The connected_clients set is now imported from websocket_handler
 
-#-------------------
-# HTTP SERVER
-#-------------------
-class DashboardHTTPRequestHandler(BaseHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.template_handler = TemplateHandler(STATIC_FOLDER)
-        self.event_manager = EventManager(LOG_FILE)
-        super().__init__(*args, **kwargs)
-        
-    def do_GET(self):
-        start_time = time.time()
-        parsed_path = urlparse(self.path)
-        
-        # Handle static file requests
-        if parsed_path.path.startswith('/static/'):
-            self.serve_static_file(parsed_path.path[8:])  # Remove '/static/' prefix
-            return
-            
-        # Handle other known static files
-        if parsed_path.path == '/dashboard.js':
-            self.serve_static_file('dashboard.js')
-            return
-        if parsed_path.path == '/styles.css':
-            self.serve_static_file('styles.css')
-            return
-        
-        # Handle the main dashboard request
-        if parsed_path.path == '/' or parsed_path.path == '/index.html':
-            query_params = parse_qs(parsed_path.query)
-            
-            # Process filtering logic
-            show_since_str = query_params.get('show_since', [None])[0]
-            show_since_dt = None
-            
-            if show_since_str:
-                try:
-                    show_since_str = show_since_str.replace('Z', '+00:00')
-                    show_since_dt = datetime.fromisoformat(show_since_str)
-                    if show_since_dt.tzinfo is None:
-                        show_since_dt = show_since_dt.astimezone(timezone.utc)
-                    print(f"Filtering events since: {show_since_dt}")
-                except ValueError:
-                    print(f"Warning: Invalid 'show_since' timestamp format: {show_since_str}. Showing all events.")
-                    show_since_dt = None
-            
-            # Get filtered events
-            events = self.event_manager.get_events(show_since_dt)
-            
-            # Generate HTML response
-            html_content = self.template_handler.render_dashboard(events, show_since_dt)
-            
-            # Send response
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(html_content.encode('utf-8'))
-            
-            end_time = time.time()
-            print(f"HTTP Request processed in {end_time - start_time:.4f} seconds. Displayed {len(events)} events.")
-            return
-            
-        # If path not recognized, return 404
-        self.send_error(404)
-    
-    def serve_static_file(self, filename):
-        """Serve a static file from the static folder."""
-        file_path = os.path.join(STATIC_FOLDER, filename)
-        
-        if not os.path.exists(file_path):
-            self.send_error(404, f"File not found: {filename}")
-            return
-            
-        # Determine content type based on file extension
-        ext = os.path.splitext(filename)[1].lower()
-        content_type = {
-            '.html': 'text/html',
-            '.css': 'text/css',
-            '.js': 'application/javascript',
-            '.json': 'application/json',
-            '.png': 'image/png',
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.gif': 'image/gif',
-            '.svg': 'image/svg+xml',
-        }.get(ext, 'application/octet-stream')
-        
-        try:
-            with open(file_path, 'rb') as f:
-                content = f.read()
-                
-            self.send_response(200)
-            self.send_header('Content-type', content_type)
-            self.send_header('Content-length', str(len(content)))
-            self.end_headers()
-            self.wfile.write(content)
-        except Exception as e:
-            self.send_error(500, f"Error serving file: {str(e)}")
-
-
 #-------------------
 # REDIS QUEUE POLLER
 #-------------------
-def redis_queue_poller():
+def redis_queue_poller(event_manager):
     """Polls Redis queues for messages and processes them."""
-    event_manager = EventManager(LOG_FILE)
-    
     print(f"Attempting to connect to Redis at {REDIS_HOST}:{REDIS_PORT} for queue polling...")
     
     while True:  # Keep trying to connect
@@ -166,25 +80,35 @@ def redis_queue_poller():
             print(f"Polling low priority queue: {LOW_PRIORITY_QUEUE}")
             print("Waiting for messages to log...")
             
+            queue_sources = {
+                HIGH_PRIORITY_QUEUE: "high priority queue",
+                LOW_PRIORITY_QUEUE: "low priority queue"
+            }
+
             # Main polling loop
             while True:
-                # Process ALL high priority messages first
-                while True:
-                    high_priority_msg = redis_client.rpop(HIGH_PRIORITY_QUEUE)
-                    if high_priority_msg:
-                        process_message(high_priority_msg, event_manager, "high priority queue")
-                    else:
-                        # No more high priority messages, can move to low priority
-                        break
-                
-                # Only after processing all high priority messages, check low priority
-                low_priority_msg = redis_client.rpop(LOW_PRIORITY_QUEUE)
-                if low_priority_msg:
-                    process_message(low_priority_msg, event_manager, "low priority queue")
-                
-                # Sleep between poll cycles
-                time.sleep(QUEUE_CHECK_INTERVAL)
-                
+                # Drain the high priority queue first, one batch per round trip
+                high_priority_msgs = pop_batch(redis_client, HIGH_PRIORITY_QUEUE, QUEUE_BATCH_SIZE)
+                if high_priority_msgs:
+                    for msg in high_priority_msgs:
+                        process_message(msg, event_manager, "high priority queue")
+                    continue
+
+                # Only when no high priority messages are waiting, take a low priority batch
+                low_priority_msgs = pop_batch(redis_client, LOW_PRIORITY_QUEUE, QUEUE_BATCH_SIZE)
+                if low_priority_msgs:
+                    for msg in low_priority_msgs:
+                        process_message(msg, event_manager, "low priority queue")
+                    continue
+
+                # Both queues are empty: block until a message arrives on either.
+                # BRPOP checks keys in order, so high priority still wins.
+                popped = redis_client.brpop([HIGH_PRIORITY_QUEUE, LOW_PRIORITY_QUEUE],
+                                            timeout=QUEUE_BLOCK_TIMEOUT)
+                if popped:
+                    queue_name, msg = popped
+                    process_message(msg, event_manager, queue_sources.get(queue_name, queue_name))
+
         except redis.exceptions.ConnectionError as e:
             print(f"Redis connection error in queue poller: {e}")
             print("Will attempt to reconnect in 15 seconds...")
@@ -195,6 +119,21 @@ def redis_queue_poller():
             time.sleep(15)
 
 
+def pop_batch(redis_client, queue_name, count):
+    """
+    Atomically pop up to `count` messages from the tail of a queue in a single
+    round trip (LRANGE + LTRIM in a MULTI block, works on any Redis version).
+
+    Returns messages oldest first, the same order repeated RPOPs would give.
+    """
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.lrange(queue_name, -count, -1)
+    pipe.ltrim(queue_name, 0, -count - 1)
+    messages, _ = pipe.execute()
+    messages.reverse()
+    return messages
+
+
 def process_message(json_data, event_manager, source="queue"):
     """Process a message received from Redis queue."""
     try:
@@ -203,11 +142,12 @@ def process_message(json_data, event_manager, source="queue"):
         event_msg = parsed_data.get('message', 'Unknown message')
         
         # Log the event
-        if event_manager.log_event(json_data):
+        logged_event = event_manager.log_event(json_data)
+        if logged_event:
             print(f"Logged event from {source}: {event_msg}")
             
-            # Trigger WebSocket broadcast for real-time updates
-            schedule_broadcast()
+            # Push the new event to dashboards over WebSocket
+            schedule_broadcast(logged_event)
         else:
             print(f"Failed to log event from {source}: {event_msg}")
             
@@ -247,7 +187,7 @@ def setup_static_folder():
     
     print(f"Static folder setup completed: {STATIC_FOLDER}")
 
-async def start_main_websocket_server():
+async def start_main_websocket_server(event_manager, template_handler):
     """Starts the WebSocket server using the compatibility layer."""
     global websocket_loop
     websocket_loop = asyncio.get_running_loop()
@@ -256,18 +196,30 @@ async def start_main_websocket_server():
     server = await start_websocket_server(
         WEBSOCKET_HOST, 
         WEBSOCKET_PORT,
-        websocket_loop
+        websocket_loop,
+        window=BROADCAST_WINDOW,
+        event_renderer=template_handler.render_event_card,
+        event_source=event_manager.get_events_after_seq
     )
     
     # Keep the server running
     await asyncio.Future()
 
-def start_http_server():
-    """Starts the HTTP server in a separate thread."""
+def start_http_server(event_manager, template_handler):
+    """Starts the HTTP server in a separate thread, serving from the shared services."""
     server_address = (HTTP_HOST, HTTP_PORT)
-    httpd = HTTPServer(server_address, DashboardHTTPRequestHandler)
+    static_assets = StaticAssetCache(STATIC_FOLDER, max_age=STATIC_CACHE_MAX_AGE)
+    static_assets.preload()
+    DashboardHTTPRequestHandler.configure(
+        event_manager, template_handler, static_assets,
+        static_folder=STATIC_FOLDER, page_size=DASHBOARD_PAGE_SIZE,
+        gzip_min_size=HTTP_GZIP_MIN_SIZE
+    )
+    httpd = PooledHTTPServer(server_address, DashboardHTTPRequestHandler,
+                             max_workers=HTTP_MAX_CONCURRENT_REQUESTS)
     print(f"Starting HTTP server on http://{HTTP_HOST}:{HTTP_PORT}")
     print(f"Serving dashboard, reading events from: {LOG_FILE}")
+    print(f"Handling up to {HTTP_MAX_CONCURRENT_REQUESTS} requests concurrently")
     http_thread = threading.Thread(target=httpd.serve_forever, daemon=True)
     http_thread.start()
     return httpd, http_thread
@@ -283,15 +235,31 @@ async def main_async():
     except IOError as e:
         print(f"Warning: Could not touch log file '{LOG_FILE}': {e}")
 
+    # Created once and shared by Redis ingestion, the HTTP handler and the WebSocket server
+    if EVENT_STORE == "sqlite":
+        print(f"Storing events in SQLite database: {SQLITE_DB_FILE}")
+        event_manager = SQLiteEventManager(SQLITE_DB_FILE, fsync_policy=LOG_FSYNC_POLICY)
+    else:
+        event_manager = EventManager(
+            LOG_FILE, fsync_policy=LOG_FSYNC_POLICY,
+            segment_max_bytes=LOG_SEGMENT_MAX_BYTES, segment_max_age=LOG_SEGMENT_MAX_AGE,
+            compress_segments=LOG_COMPRESS_SEGMENTS,
+            search=SEARCH_ENABLED, search_extra_files=sorted(glob.glob(SEARCH_BACKUP_FILES)),
+            search_max_events=SEARCH_MAX_EVENTS
+        )
+    template_handler = TemplateHandler(STATIC_FOLDER)
+
     # Start Redis queue poller in a separate thread
-    queue_poller_thread = threading.Thread(target=redis_queue_poller, daemon=True)
+    queue_poller_thread = threading.Thread(target=redis_queue_poller, args=(event_manager,), daemon=True)
     queue_poller_thread.start()
 
     # Start HTTP server in its own thread
-    httpd, http_thread = start_http_server()
+    httpd, http_thread = start_http_server(event_manager, template_handler)
 
     # Start WebSocket server (runs in the current async context)
-    websocket_server_task = asyncio.create_task(start_main_websocket_server())
+    websocket_server_task = asyncio.create_task(
+        start_main_websocket_server(event_manager, template_handler)
+    )
 
     # Keep main process alive and handle shutdown
     try:
@@ -303,6 +271,7 @@ async def main_async():
         httpd.shutdown()  # Signal HTTP server to stop
         http_thread.join(timeout=2)  # Wait briefly for HTTP thread
         print("HTTP server stopped.")
+        event_manager.close()  # Write out any queued events
         # Queue poller thread is daemon, will exit automatically
         # WebSocket server stops when task is cancelled
         print("All servers shut down.")
@@ -1,91 +1,1245 @@
 #!/usr/bin/env python
 import json
+import base64
+import bisect
+import gzip
+import heapq
+import math
+import re
+import shutil
+import time
+from collections import deque
+from itertools import islice
+import threading
+import atexit
 from datetime import datetime, timezone
 import os
 from pathlib import Path
 
+from log_writer import BatchedLogWriter, WRITER_BATCH_SIZE, WRITER_FLUSH_INTERVAL, FSYNC_INTERVAL
+from search_index import SearchIndex, read_events_at, SEARCH_MAX_EVENTS
+from event_stats import EventRollups
+
+# Maximum number of parsed events kept in memory
+MAX_CACHED_EVENTS = 50000
+
+# Width of the time buckets in the sidecar index, in seconds
+INDEX_BUCKET_SECONDS = 60
+# Persist the sidecar index at least every this many logged events
+INDEX_SAVE_INTERVAL = 500
+INDEX_VERSION = 3
+
+# Segment rollover: once the active log reaches this size (bytes) or age
+# (seconds, None to disable) it is sealed as events.log.NNNNNN
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+SEGMENT_MAX_AGE = None
+
+# Seconds between saves of the per-second/minute/hour rollups
+STATS_SAVE_INTERVAL = 60
+
+# Number of most recent events kept by sequence number so reconnecting
+# dashboards can catch up on what they missed
+RESUME_BUFFER_SIZE = 1000
+
+# Page size limits for query_events
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Pages older than the ring without a 'since' read the log backwards in
+# windows starting at this many seconds and doubling each time
+OLDER_EVENTS_WINDOW = 3600
+
+# Fields events can be filtered on; 'event_type' is event_info['type']
+FILTER_FIELDS = ('client_id', 'client_name', 'priority', 'event_type')
+
+def event_field(event_data, field):
+    """Value of a filterable field for an event, as a string, or None if it has none."""
+    if field == 'event_type':
+        event_info = event_data.get('event_info')
+        value = event_info.get('type') if isinstance(event_info, dict) else None
+    else:
+        value = event_data.get(field)
+    if value is None:
+        return None
+    value = str(value)
+    # Priorities are compared case-insensitively, as the dashboard shows them
+    return value.lower() if field == 'priority' else value
+
+def normalize_filters(filters):
+    """
+    Turn {field: value or list of values} into {field: set of values},
+    dropping fields with no values. Events match if every given field has
+    one of its values.
+
+    Raises:
+        ValueError: If a field isn't one of FILTER_FIELDS
+    """
+    normalized = {}
+    for field, values in (filters or {}).items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Unknown filter field: {field}")
+        if isinstance(values, str):
+            values = [values]
+        values = {str(v).lower() if field == 'priority' else str(v) for v in values if v is not None and v != ''}
+        if values:
+            normalized[field] = values
+    return normalized
+
+def event_matches(event_data, filters):
+    """Whether an event matches normalized filters."""
+    return all(event_field(event_data, field) in values for field, values in filters.items())
+
+def parse_event_timestamp(time_str):
+    """Parse an event 'time' string into a UTC timestamp. Naive times are taken as local time."""
+    event_dt = datetime.fromisoformat(time_str.replace('Z', '+00:00'))
+    if event_dt.tzinfo is None:
+        event_dt = event_dt.astimezone(timezone.utc)
+    return event_dt.timestamp()
+
+def event_cursor(event_data):
+    """Cursor for query_events that continues just after this event, or '' if it has no valid time."""
+    try:
+        return encode_cursor(parse_event_timestamp(event_data['time']), event_data.get('seq', 0))
+    except (KeyError, ValueError, AttributeError, TypeError):
+        return ''
+
+def encode_cursor(event_ts, seq):
+    """Encode a paging position (event time, seq) as an opaque URL-safe string."""
+    raw = json.dumps([event_ts, seq], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        event_ts, seq = json.loads(raw)
+        return float(event_ts), int(seq)
+    except (ValueError, TypeError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
 class EventManager:
     """Manages event logging and retrieval."""
-    
-    def __init__(self, log_file="events.log"):
-        """Initialize with path to the log file."""
+
+    def __init__(self, log_file="events.log", max_cached_events=MAX_CACHED_EVENTS,
+                 index_bucket_seconds=INDEX_BUCKET_SECONDS, writer_batch_size=WRITER_BATCH_SIZE,
+                 writer_flush_interval=WRITER_FLUSH_INTERVAL, fsync_policy="none",
+                 fsync_interval=FSYNC_INTERVAL, segment_max_bytes=SEGMENT_MAX_BYTES,
+                 segment_max_age=SEGMENT_MAX_AGE, compress_segments=False,
+                 search=False, search_extra_files=(), search_max_events=SEARCH_MAX_EVENTS):
+        """
+        Initialize with path to the log file.
+
+        With search=True a full-text index over the log, its segments and
+        any search_extra_files (e.g. log_backups/*.bak) is kept up to date
+        in '<log_file>.search', holding at most about search_max_events
+        of the newest events.
+        """
         self.log_file = log_file
-        
+        self.index_file = f"{log_file}.idx"
+        # Highest seq ever handed out; kept apart from the index so that
+        # truncating the log (clear_logs.sh) doesn't restart numbering
+        self.seq_file = f"{log_file}.seq"
+        self._saved_seq = 0
+        self.max_cached_events = max_cached_events
+        self.index_bucket_seconds = index_bucket_seconds
+
+        # Segment rollover settings (None disables that trigger)
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_age = segment_max_age
+        self.compress_segments = compress_segments
+
+        # Batched writer settings; the writer thread is only started by the
+        # first log_event, so read-only instances never spawn one
+        self.writer_batch_size = writer_batch_size
+        self.writer_flush_interval = writer_flush_interval
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self._writer = None
+
+        # In-memory ring of parsed events, kept sorted by event time.
+        # _event_keys holds (timestamp, insertion counter) so bisect can
+        # find the first event after a given time without touching the log.
+        self._event_keys = []
+        self._events = []
+        self._counter = 0
+        # Inverted indexes over the ring: field -> value -> sorted ring keys,
+        # so filtered queries only touch matching events
+        self._postings = {field: {} for field in FILTER_FIELDS}
+        self._event_by_key = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        # Events at or before this timestamp may be missing from the ring
+        # and have to be read from disk
+        self._cache_floor = float('-inf')
+
+        # Sidecar index: time bucket -> [first byte offset, event count,
+        # end offset of its last event].
+        # _indexed_upto is the log offset up to which the index is complete.
+        self._index_buckets = {}
+        self._indexed_upto = 0
+        self._unsaved_index_events = 0
+
+        # Time range, newest seq and start time of the active log segment
+        self._active_min_ts = None
+        self._active_max_ts = None
+        self._active_last_seq = 0
+        self._active_started = None
+
+        # Sealed segments, oldest first. Each is a dict with the segment's
+        # file name, min_ts, max_ts, count and last_seq.
+        self._segments = []
+        self._segment_meta = {}
+        self._next_segment = 1
+        self._compress_threads = []
+
+        # Full-text search index, if enabled
+        self._search = None
+
+        # Event counts per second/minute/hour, saved to '<log_file>.stats'
+        self.stats_file = f"{log_file}.stats"
+        self._rollups = EventRollups(FILTER_FIELDS)
+        self._stats_saved = time.monotonic()
+
+        # Every logged event gets a persistent, increasing 'seq' number
+        self._last_seq = 0
+        self._recent = deque(maxlen=RESUME_BUFFER_SIZE)
+
         # Ensure log file exists
         try:
             Path(log_file).touch(exist_ok=True)
         except IOError as e:
             print(f"Warning: Could not touch log file '{log_file}': {e}")
-    
+
+        self._load_events()
+
+        self._load_stats()
+
+        if search:
+            self._search = SearchIndex(f"{log_file}.search", max_events=search_max_events)
+            self._catch_up_search(search_extra_files)
+
+        # Finish compressing segments sealed before a restart
+        if self.compress_segments:
+            for segment in self._segments:
+                if not segment['file'].endswith('.gz'):
+                    self._start_compression(segment)
+
+    def _parse_event_time(self, event_data, offset=None):
+        """Return the event's 'time' field as a UTC timestamp, or None if invalid."""
+        where = f"Log line at offset {offset}" if offset is not None else "Event"
+        event_time_str = event_data.get('time')
+
+        if not event_time_str:
+            print(f"Warning: {where} missing 'time' field. Skipping.")
+            return None
+
+        try:
+            return parse_event_timestamp(event_time_str)
+        except (ValueError, AttributeError):
+            print(f"Warning: {where} has invalid 'time' format: {event_time_str}. Skipping.")
+            return None
+
+    def _insert_event(self, event_ts, event_data):
+        """Insert a parsed event into the ring, evicting the oldest if full."""
+        if event_ts <= self._cache_floor:
+            # Older than what the ring covers, only reachable through the index
+            return
+
+        key = (event_ts, self._counter)
+        self._counter += 1
+
+        # Events normally arrive in time order, so this is usually an append
+        if not self._event_keys or key > self._event_keys[-1]:
+            self._event_keys.append(key)
+            self._events.append(event_data)
+        else:
+            index = bisect.bisect_right(self._event_keys, key)
+            self._event_keys.insert(index, key)
+            self._events.insert(index, event_data)
+
+        self._event_by_key[key] = event_data
+        for field, postings in self._postings.items():
+            value = event_field(event_data, field)
+            if value is None:
+                continue
+            keys = postings.setdefault(value, [])
+            if not keys or key > keys[-1]:
+                keys.append(key)
+            else:
+                bisect.insort(keys, key)
+
+        excess = len(self._events) - self.max_cached_events
+        if excess > 0:
+            self._cache_floor = max(self._cache_floor, self._event_keys[excess - 1][0])
+            # Evict the rest of the events sharing the floor's time too, so
+            # no event is both in the ring and in a disk read up to the floor
+            while excess < len(self._event_keys) and self._event_keys[excess][0] <= self._cache_floor:
+                excess += 1
+            self._drop_postings(self._event_keys[:excess], self._events[:excess])
+            del self._event_keys[:excess]
+            del self._events[:excess]
+
+    def _drop_postings(self, keys, events):
+        """Remove the oldest ring events from the inverted indexes."""
+        # Evicted keys are the smallest in the ring, so they are at the
+        # front of every posting list they appear in
+        drop = {}
+        for key, event_data in zip(keys, events):
+            del self._event_by_key[key]
+            for field in FILTER_FIELDS:
+                value = event_field(event_data, field)
+                if value is not None:
+                    drop[(field, value)] = drop.get((field, value), 0) + 1
+        for (field, value), count in drop.items():
+            postings = self._postings[field]
+            del postings[value][:count]
+            if not postings[value]:
+                del postings[value]
+
+    def _iter_ring(self, since_ts=None, upper_ts=None, filters=None):
+        """
+        Yield (timestamp, event) for ring events with since_ts < time <= upper_ts
+        that match filters, newest first. Call with _lock held.
+
+        With filters, only the posting lists of the most selective field are
+        walked, so the cost follows the number of matches, not the ring size.
+        """
+        lo_key = (since_ts, float('inf')) if since_ts is not None else None
+        hi_key = (upper_ts, float('inf')) if upper_ts is not None else None
+
+        if not filters:
+            lo = 0 if lo_key is None else bisect.bisect_right(self._event_keys, lo_key)
+            hi = len(self._event_keys) if hi_key is None else bisect.bisect_right(self._event_keys, hi_key)
+            for i in range(hi - 1, lo - 1, -1):
+                yield self._event_keys[i][0], self._events[i]
+            return
+
+        # Slice each field's posting lists down to the time range and pick
+        # the field with the fewest candidates
+        best = None
+        for field, values in filters.items():
+            slices = []
+            total = 0
+            for value in values:
+                keys = self._postings[field].get(value)
+                if not keys:
+                    continue
+                lo = 0 if lo_key is None else bisect.bisect_right(keys, lo_key)
+                hi = len(keys) if hi_key is None else bisect.bisect_right(keys, hi_key)
+                if hi > lo:
+                    slices.append((keys, lo, hi))
+                    total += hi - lo
+            if best is None or total < best[0]:
+                best = (total, field, slices)
+        if not best[0]:
+            return
+
+        _, field, slices = best
+        others = {f: v for f, v in filters.items() if f != field}
+        streams = [map(keys.__getitem__, range(hi - 1, lo - 1, -1)) for keys, lo, hi in slices]
+        for key in heapq.merge(*streams, reverse=True):
+            event_data = self._event_by_key[key]
+            if not others or event_matches(event_data, others):
+                yield key[0], event_data
+
+    def _bucket(self, event_ts):
+        """Return the sidecar index bucket for a timestamp."""
+        return int(event_ts // self.index_bucket_seconds)
+
+    def _iter_log_lines(self, start_offset=0, path=None):
+        """
+        Yield (offset, end offset, event, timestamp) for each complete log line
+        from start_offset on. Reads the active log unless path names a segment.
+        """
+        path = path or self.log_file
+        offset = start_offset
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            if start_offset:
+                f.seek(start_offset)
+            for raw_line in f:
+                line_offset = offset
+                offset += len(raw_line)
+                if not raw_line.endswith(b'\n'):
+                    # Partially written last line, pick it up next time
+                    break
+
+                line = raw_line.decode('utf-8', errors='replace').strip()
+                if not line:
+                    yield line_offset, offset, None, None
+                    continue
+
+                try:
+                    event_data = json.loads(line)
+                    yield line_offset, offset, event_data, self._parse_event_time(event_data, line_offset)
+                except json.JSONDecodeError:
+                    print(f"Warning: Invalid JSON on log line at offset {line_offset}. Skipping: {line[:100]}...")
+                    yield line_offset, offset, None, None
+
+    def _index_event(self, event_ts, offset, end):
+        """Record an event stored at [offset, end) in the sidecar index."""
+        if self._active_min_ts is None:
+            self._active_min_ts = self._active_max_ts = event_ts
+            if self._active_started is None:
+                self._active_started = time.time()
+        else:
+            self._active_min_ts = min(self._active_min_ts, event_ts)
+            self._active_max_ts = max(self._active_max_ts, event_ts)
+
+        bucket = self._bucket(event_ts)
+        entry = self._index_buckets.get(bucket)
+        if entry is None:
+            self._index_buckets[bucket] = [offset, 1, end]
+            return True
+        entry[0] = min(entry[0], offset)
+        entry[1] += 1
+        entry[2] = max(entry[2], end)
+        return False
+
+    def _load_index(self):
+        """Load the sidecar index, discarding it if it doesn't match the log file."""
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                index_data = json.load(f)
+            if (index_data.get('version') != INDEX_VERSION or
+                    index_data.get('bucket_seconds') != self.index_bucket_seconds):
+                print(f"Index file '{self.index_file}' has a different format. Rebuilding.")
+                return
+            indexed_upto = index_data['indexed_upto']
+            if indexed_upto > os.path.getsize(self.log_file):
+                print(f"Index file '{self.index_file}' is ahead of the log (truncated?). Rebuilding.")
+                return
+            self._index_buckets = {bucket: [offset, count, end]
+                                   for bucket, offset, count, end in index_data['buckets']}
+            self._indexed_upto = indexed_upto
+            self._last_seq = index_data.get('last_seq', 0)
+            active = index_data.get('active', {})
+            self._active_min_ts = active.get('min_ts')
+            self._active_max_ts = active.get('max_ts')
+            self._active_last_seq = active.get('last_seq', 0)
+            self._active_started = active.get('started')
+            self._segment_meta = {segment['file']: segment for segment in index_data.get('segments', [])}
+        except FileNotFoundError:
+            print(f"Index file '{self.index_file}' not found. Building it from the log.")
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Warning: Could not read index file '{self.index_file}': {e}. Rebuilding.")
+
+    def _load_seq(self):
+        """Highest seq saved by _save_seq (0 if there is none)."""
+        try:
+            with open(self.seq_file, 'r', encoding='utf-8') as f:
+                self._saved_seq = int(f.read().strip() or 0)
+                return self._saved_seq
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read seq file '{self.seq_file}': {e}")
+            return 0
+
+    def _save_seq(self):
+        """Atomically record the highest seq handed out so far, if it grew."""
+        if self._last_seq <= self._saved_seq:
+            return
+        tmp_file = f"{self.seq_file}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(f"{self._last_seq}\n")
+            os.replace(tmp_file, self.seq_file)
+            self._saved_seq = self._last_seq
+        except OSError as e:
+            print(f"Warning: Could not write seq file '{self.seq_file}': {e}")
+
+    def _save_index(self):
+        """Atomically write the sidecar index next to the log file (and the seq high-water mark)."""
+        index_data = {
+            'version': INDEX_VERSION,
+            'bucket_seconds': self.index_bucket_seconds,
+            'indexed_upto': self._indexed_upto,
+            'last_seq': self._last_seq,
+            'buckets': [[bucket, offset, count, end]
+                        for bucket, (offset, count, end) in sorted(self._index_buckets.items())],
+            'active': {
+                'min_ts': self._active_min_ts,
+                'max_ts': self._active_max_ts,
+                'last_seq': self._active_last_seq,
+                'started': self._active_started,
+            },
+            'segments': self._segments,
+        }
+        tmp_file = f"{self.index_file}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(index_data, f, separators=(',', ':'))
+            os.replace(tmp_file, self.index_file)
+            self._unsaved_index_events = 0
+        except OSError as e:
+            print(f"Warning: Could not write index file '{self.index_file}': {e}")
+        self._save_seq()
+
+    def _catch_up_index(self, end_offset=None):
+        """
+        Index any log lines appended since the index was last written (up to end_offset).
+
+        Returns:
+            Tuple of (number of events indexed, highest 'seq' seen)
+        """
+        if os.path.getsize(self.log_file) < self._indexed_upto:
+            print(f"Log file '{self.log_file}' shrank since it was indexed. Rebuilding index.")
+            self._reset_active_index()
+
+        indexed = 0
+        max_seq = 0
+        for line_offset, line_end, event_data, event_ts in self._iter_log_lines(self._indexed_upto):
+            if end_offset is not None and line_end > end_offset:
+                break
+            if event_data is not None and isinstance(event_data.get('seq'), int):
+                max_seq = max(max_seq, event_data['seq'])
+                self._active_last_seq = max(self._active_last_seq, event_data['seq'])
+            if event_ts is not None:
+                self._index_event(event_ts, line_offset, line_end)
+                indexed += 1
+            self._indexed_upto = line_end
+
+        if indexed:
+            print(f"Indexed {indexed} new event(s) from '{self.log_file}'.")
+        return indexed, max_seq
+
+    def _first_offset_after(self, bucket):
+        """Smallest byte offset of any event in this bucket or a later one."""
+        offsets = [offset for b, (offset, _, _) in self._index_buckets.items() if b >= bucket]
+        return min(offsets) if offsets else self._indexed_upto
+
+    def _end_offset_upto(self, bucket):
+        """Offset just past the last event in this bucket or an earlier one (0 if there is none)."""
+        return max((end for b, (_, _, end) in self._index_buckets.items() if b <= bucket), default=0)
+
+    def _reset_active_index(self):
+        """Forget everything indexed about the active log segment."""
+        self._index_buckets = {}
+        self._indexed_upto = 0
+        self._active_min_ts = None
+        self._active_max_ts = None
+        self._active_last_seq = 0
+        self._active_started = None
+
+    def _segment_path(self, name):
+        """Path of a sealed segment file, which lives next to the active log."""
+        return os.path.join(os.path.dirname(self.log_file), name)
+
+    def _iter_segment(self, segment):
+        """Yield (offset, end offset, event, timestamp) for each line of a sealed segment."""
+        path = self._segment_path(segment['file'])
+        if not path.endswith('.gz') and not os.path.exists(path):
+            # Compressed since the caller looked it up
+            path += '.gz'
+        return self._iter_log_lines(path=path)
+
+    def _scan_segment(self, name):
+        """Work out a segment's metadata by reading it (when the index doesn't have it)."""
+        segment = {'file': name, 'min_ts': None, 'max_ts': None, 'count': 0, 'last_seq': 0}
+        for _, _, event_data, event_ts in self._iter_log_lines(path=self._segment_path(name)):
+            if event_data is not None and isinstance(event_data.get('seq'), int):
+                segment['last_seq'] = max(segment['last_seq'], event_data['seq'])
+            if event_ts is not None:
+                segment['count'] += 1
+                segment['min_ts'] = event_ts if segment['min_ts'] is None else min(segment['min_ts'], event_ts)
+                segment['max_ts'] = event_ts if segment['max_ts'] is None else max(segment['max_ts'], event_ts)
+        print(f"Scanned log segment '{name}': {segment['count']} event(s).")
+        return segment
+
+    def _load_segments(self):
+        """
+        Find the sealed segments next to the log and match them up with the
+        metadata saved in the index, scanning any the index doesn't know.
+
+        Returns:
+            True if the segment list differs from what the index recorded
+        """
+        directory = os.path.dirname(self.log_file) or '.'
+        pattern = re.compile(re.escape(os.path.basename(self.log_file)) + r'\.(\d+)(\.gz)?(\.tmp)?$')
+        found = {}
+        for name in os.listdir(directory):
+            match = pattern.match(name)
+            if not match:
+                continue
+            if match.group(3):
+                # Left over from an interrupted compression
+                os.remove(os.path.join(directory, name))
+                continue
+            number = int(match.group(1))
+            if number in found and not match.group(2):
+                # Both plain and compressed copies exist, keep the compressed one
+                os.remove(os.path.join(directory, name))
+                continue
+            if number in found:
+                os.remove(self._segment_path(found[number]))
+            found[number] = name
+
+        changed = False
+        self._segments = []
+        for number, name in sorted(found.items()):
+            segment = self._segment_meta.get(name)
+            if segment is None:
+                plain_name = name[:-3] if name.endswith('.gz') else name
+                segment = self._segment_meta.get(plain_name) or self._segment_meta.get(f"{plain_name}.gz")
+                segment = dict(segment, file=name) if segment else self._scan_segment(name)
+                changed = True
+            self._segments.append(segment)
+        if len(self._segments) != len(self._segment_meta):
+            changed = True
+        self._segment_meta = {}
+        self._next_segment = max(found, default=0) + 1
+        return changed
+
+    def _load_events(self):
+        """Bring the sidecar index up to date and fill the ring from the newest events."""
+        try:
+            self._load_index()
+            segments_changed = self._load_segments()
+            indexed, max_seq = self._catch_up_index()
+            self._last_seq = max([self._last_seq, max_seq, self._load_seq()] +
+                                 [s['last_seq'] for s in self._segments])
+            if indexed or segments_changed or not os.path.exists(self.index_file):
+                self._save_index()
+
+            # Walk back from the newest bucket until the ring would be full
+            collected = []
+            floor = float('-inf')
+            total = 0
+            floor_bucket = None
+            buckets = sorted(self._index_buckets.items(), reverse=True)
+            for bucket, (_, count, _) in buckets:
+                total += count
+                floor_bucket = bucket
+                if total >= self.max_cached_events:
+                    break
+            if floor_bucket is not None:
+                if floor_bucket != buckets[-1][0]:
+                    # Just below the bucket start, so events exactly on it are kept
+                    floor = math.nextafter(floor_bucket * self.index_bucket_seconds, float('-inf'))
+
+                start_offset = self._first_offset_after(floor_bucket)
+                for _, end_offset, event_data, event_ts in self._iter_log_lines(start_offset):
+                    if end_offset > self._indexed_upto:
+                        break
+                    if event_ts is not None:
+                        collected.append((event_ts, event_data))
+
+            # If the active segment doesn't fill the ring, continue into the
+            # newest sealed segments
+            unloaded = list(self._segments)
+            while unloaded and total < self.max_cached_events and floor == float('-inf'):
+                segment = unloaded.pop()
+                for _, _, event_data, event_ts in self._iter_segment(segment):
+                    if event_ts is not None:
+                        collected.append((event_ts, event_data))
+                total += segment['count']
+            newest_unloaded = [s['max_ts'] for s in unloaded if s['max_ts'] is not None]
+            if newest_unloaded:
+                floor = max(floor, max(newest_unloaded))
+
+            collected.sort(key=lambda item: item[0])
+            excess = len(collected) - self.max_cached_events
+            if excess > 0:
+                floor = max(floor, collected[excess - 1][0])
+            self._cache_floor = floor
+            for event_ts, event_data in collected:
+                self._insert_event(event_ts, event_data)
+        except FileNotFoundError:
+            print(f"Log file '{self.log_file}' not found. Creating a new file.")
+            Path(self.log_file).touch()
+        except Exception as e:
+            print(f"Error reading or processing log file '{self.log_file}': {e}")
+
+    def _read_events_range(self, since_ts=None, until_ts=None, filters=None):
+        """
+        Seek to the first indexed offset that can hold events after since_ts and
+        stream up to the end of the last line in until_ts's bucket or earlier,
+        keeping events with since_ts < time <= until_ts that match filters.
+
+        Returns:
+            List of (timestamp, event) tuples, oldest first
+        """
+        def in_range(event_ts, event_data):
+            if event_ts is None:
+                return False
+            if since_ts is not None and event_ts <= since_ts:
+                return False
+            if until_ts is not None and event_ts > until_ts:
+                return False
+            return not filters or event_matches(event_data, filters)
+
+        while True:
+            with self._lock:
+                rotation = self._next_segment
+                if since_ts is None:
+                    start_offset = 0
+                else:
+                    start_offset = self._first_offset_after(self._bucket(since_ts))
+                if until_ts is None:
+                    end_offset = self._indexed_upto
+                else:
+                    end_offset = min(self._end_offset_upto(self._bucket(until_ts)), self._indexed_upto)
+                # Skip sealed segments whose time range can't overlap the query
+                segments = [
+                    dict(segment) for segment in self._segments
+                    if segment['count'] and
+                    (since_ts is None or segment['max_ts'] > since_ts) and
+                    (until_ts is None or segment['min_ts'] <= until_ts)
+                ]
+
+            matched = []
+            for segment in segments:
+                try:
+                    for _, _, event_data, event_ts in self._iter_segment(segment):
+                        if in_range(event_ts, event_data):
+                            matched.append((event_ts, event_data))
+                except Exception as e:
+                    print(f"Error reading log segment '{segment['file']}': {e}")
+
+            try:
+                for _, line_end, event_data, event_ts in self._iter_log_lines(start_offset):
+                    if line_end > end_offset:
+                        break
+                    if in_range(event_ts, event_data):
+                        matched.append((event_ts, event_data))
+            except Exception as e:
+                print(f"Error reading or processing log file '{self.log_file}': {e}")
+
+            if not self._rotated_since(rotation):
+                break
+
+        matched.sort(key=lambda item: item[0])
+        return matched
+
+    def _rotated_since(self, rotation):
+        """
+        Whether the active log was sealed since _next_segment was rotation.
+        Offsets taken before a rotation point into what is now a segment,
+        so a read of the active log in between has to be redone.
+        """
+        with self._lock:
+            return self._next_segment != rotation
+
+    def _iter_older_events(self, since_ts, until_ts, filters=None):
+        """
+        Yield (timestamp, event) for events with since_ts < time <= until_ts
+        that match filters, newest first. Without since_ts the log is read
+        backwards in widening windows down to its oldest event, so a page
+        just below the ring doesn't read the whole history.
+        """
+        if since_ts is not None:
+            yield from reversed(self._read_events_range(since_ts, until_ts, filters))
+            return
+
+        with self._lock:
+            starts = [segment['min_ts'] for segment in self._segments if segment['min_ts'] is not None]
+            if self._active_min_ts is not None:
+                starts.append(self._active_min_ts)
+        if not starts:
+            return
+        oldest = min(starts)
+        window = OLDER_EVENTS_WINDOW
+        while until_ts >= oldest:
+            lower = until_ts - window
+            yield from reversed(self._read_events_range(lower, until_ts, filters))
+            until_ts = lower
+            window *= 2
+
+    def _index_file_for_search(self, path, end_offset=None):
+        """Add the lines of a log file after what the search index has seen (up to end_offset)."""
+        added = 0
+        start_offset = self._search.indexed_upto(path)
+        for line_offset, line_end, event_data, event_ts in self._iter_log_lines(start_offset, path=path):
+            if end_offset is not None and line_end > end_offset:
+                break
+            if event_data is not None:
+                self._search.add(path, line_offset, line_end, event_ts, event_data)
+                added += 1
+        return added
+
+    def _is_search_copy(self, path, candidate):
+        """Whether candidate holds the last event the search index has of path, at the same offset."""
+        last = self._search.last_event(path)
+        if last is None:
+            return False
+        offset, end, event_ts = last
+        try:
+            if os.path.getsize(candidate) < end:
+                return False
+            line = next(self._iter_log_lines(offset, path=candidate), None)
+        except OSError:
+            return False
+        if line is None or line[1] != end:
+            return False
+        return (line[3] if line[3] is not None else -math.inf) == event_ts
+
+    def _catch_up_search(self, extra_files=()):
+        """Index whatever the search journal hasn't seen: new segments, the active log's tail and extra files."""
+        added = 0
+        for segment in self._segments:
+            path = self._segment_path(segment['file'])
+            plain_path = path[:-3] if path.endswith('.gz') else path
+            if self._search.knows(path):
+                continue
+            if self._search.knows(plain_path):
+                # Compressed while the index wasn't watching
+                self._search.rename(plain_path, path)
+                continue
+            added += self._index_file_for_search(path)
+
+        if os.path.getsize(self.log_file) < self._search.indexed_upto(self.log_file):
+            # clear_logs.sh copies the log into log_backups before emptying
+            # it; point the indexed events at the copy instead of indexing
+            # them twice
+            backup = next((path for path in extra_files
+                           if not self._search.knows(path) and self._is_search_copy(self.log_file, path)), None)
+            if backup:
+                print(f"Log file '{self.log_file}' was backed up to '{backup}' since it was searched.")
+                self._search.rename(self.log_file, backup)
+            else:
+                print(f"Log file '{self.log_file}' shrank since it was searched. Re-indexing it.")
+                self._search.forget(self.log_file)
+        added += self._index_file_for_search(self.log_file, end_offset=self._indexed_upto)
+
+        for path in extra_files:
+            try:
+                if os.path.getsize(path) < self._search.indexed_upto(path):
+                    self._search.forget(path)
+                added += self._index_file_for_search(path)
+            except OSError as e:
+                print(f"Warning: Could not index '{path}' for search: {e}")
+
+        self._search.save()
+        if added:
+            print(f"Added {added} event(s) to the search index.")
+
+    def _count_event(self, event_ts, event_data):
+        """Add an event to the rollups."""
+        values = {field: event_field(event_data, field) for field in FILTER_FIELDS}
+        seq = event_data.get('seq')
+        self._rollups.add(event_ts, values, seq=seq if isinstance(seq, int) else None)
+
+    def _load_stats(self):
+        """Load the saved rollups and count the events logged since they were saved."""
+        loaded = self._rollups.load(self.stats_file)
+        after_seq = self._rollups.last_seq if loaded else None
+
+        def new_events(lines):
+            for _, _, event_data, event_ts in lines:
+                if event_ts is None:
+                    continue
+                seq = event_data.get('seq')
+                if after_seq is None or (isinstance(seq, int) and seq > after_seq):
+                    yield event_ts, event_data
+
+        counted = 0
+        try:
+            for segment in self._segments:
+                if after_seq is not None and segment['last_seq'] <= after_seq:
+                    continue
+                for event_ts, event_data in new_events(self._iter_segment(segment)):
+                    self._count_event(event_ts, event_data)
+                    counted += 1
+            if after_seq is None or self._active_last_seq > after_seq:
+                for event_ts, event_data in new_events(self._iter_log_lines()):
+                    self._count_event(event_ts, event_data)
+                    counted += 1
+        except OSError as e:
+            print(f"Warning: Could not read the log to update stats: {e}")
+
+        if counted or not loaded:
+            print(f"Counted {counted} event(s) into the stats rollups.")
+            self._save_stats()
+
+    def _save_stats(self):
+        self._rollups.save(self.stats_file)
+        self._stats_saved = time.monotonic()
+
+    def _get_writer(self):
+        """Start the batched log writer on first use."""
+        if self._writer is None:
+            self._writer = BatchedLogWriter(
+                self.log_file,
+                on_flush=self._on_batch_written,
+                batch_size=self.writer_batch_size,
+                flush_interval=self.writer_flush_interval,
+                fsync_policy=self.fsync_policy,
+                fsync_interval=self.fsync_interval
+            )
+            atexit.register(self.close)
+        return self._writer
+
+    def _on_batch_written(self, start_offset, entries):
+        """Index a batch of events once the writer has put it on disk."""
+        with self._lock:
+            # Another writer touched the log since we last indexed it
+            if start_offset != self._indexed_upto:
+                self._catch_up_index(end_offset=start_offset)
+                if self._search:
+                    self._index_file_for_search(self.log_file, end_offset=start_offset)
+
+            new_bucket = False
+            for offset, line, (event_ts, seq, event_dict) in entries:
+                if event_ts is not None:
+                    new_bucket = self._index_event(event_ts, offset, offset + len(line)) or new_bucket
+                    self._unsaved_index_events += 1
+                    self._count_event(event_ts, event_dict)
+                self._active_last_seq = max(self._active_last_seq, seq)
+                self._indexed_upto = offset + len(line)
+                if self._search:
+                    self._search.add(self.log_file, offset, offset + len(line), event_ts, event_dict)
+            if self._search:
+                self._search.save()
+            if time.monotonic() - self._stats_saved >= STATS_SAVE_INTERVAL:
+                self._save_stats()
+
+            if self._segment_full():
+                self._rotate_segment()
+            elif new_bucket or self._unsaved_index_events >= INDEX_SAVE_INTERVAL:
+                self._save_index()
+
+    def _segment_full(self):
+        """Whether the active log has reached its size or age limit."""
+        if not self._indexed_upto:
+            return False
+        if self.segment_max_bytes and self._indexed_upto >= self.segment_max_bytes:
+            return True
+        return bool(self.segment_max_age and self._active_started is not None and
+                    time.time() - self._active_started >= self.segment_max_age)
+
+    def _rotate_segment(self):
+        """
+        Seal the active log as the next numbered segment and start a new one.
+        Runs on the writer thread between batches (from its flush callback),
+        holding _lock, so no write or query sees a half-rotated log.
+        """
+        name = f"{os.path.basename(self.log_file)}.{self._next_segment:06d}"
+        path = self._segment_path(name)
+        try:
+            self._writer.reopen()
+            os.replace(self.log_file, path)
+            open(self.log_file, 'ab').close()
+        except OSError as e:
+            print(f"Warning: Could not rotate log file '{self.log_file}' to '{path}': {e}")
+            return
+        if self._search:
+            self._search.rename(self.log_file, path)
+            self._search.save()
+
+        segment = {
+            'file': name,
+            'min_ts': self._active_min_ts,
+            'max_ts': self._active_max_ts,
+            'count': sum(count for _, count, _ in self._index_buckets.values()),
+            'last_seq': self._active_last_seq,
+        }
+        self._segments.append(segment)
+        self._next_segment += 1
+        self._reset_active_index()
+        self._save_index()
+        print(f"Rotated log file: sealed {segment['count']} event(s) as '{path}'.")
+
+        if self.compress_segments:
+            self._start_compression(segment)
+
+    def _start_compression(self, segment):
+        """Gzip a sealed segment in the background."""
+        thread = threading.Thread(target=self._compress_segment, args=(segment,),
+                                  name="segment-compressor", daemon=True)
+        self._compress_threads = [t for t in self._compress_threads if t.is_alive()]
+        self._compress_threads.append(thread)
+        thread.start()
+
+    def _compress_segment(self, segment):
+        """Write segment.gz, switch the index over to it, then remove the plain file."""
+        name = segment['file']
+        path = self._segment_path(name)
+        tmp_path = f"{path}.gz.tmp"
+        try:
+            with open(path, 'rb') as f_in, gzip.open(tmp_path, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.replace(tmp_path, f"{path}.gz")
+        except OSError as e:
+            print(f"Warning: Could not compress log segment '{path}': {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            segment['file'] = f"{name}.gz"
+            self._save_index()
+            if self._search:
+                self._search.rename(path, f"{path}.gz")
+                self._search.save()
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Warning: Could not remove compressed log segment '{path}': {e}")
+
     def log_event(self, event_data):
-        """Log an event to the log file."""
+        """
+        Log an event. The event is visible to get_events immediately and is
+        appended to the log file by the batched writer shortly after.
+
+        Returns:
+            The logged event dictionary (with 'server_time' and 'seq' added),
+            or False if it could not be logged
+        """
         try:
             if isinstance(event_data, str):
                 event_dict = json.loads(event_data)
-                event_dict['server_time'] = datetime.now(timezone.utc).isoformat()
-                json_data = json.dumps(event_dict)
             else:
-                event_data['server_time'] = datetime.now(timezone.utc).isoformat()
-                json_data = json.dumps(event_data)
-                
-            # Write to log file
-            with open(self.log_file, 'a', encoding='utf-8') as f:
-                f.write(json_data + '\n')
-            return True
+                event_dict = event_data
+            event_dict['server_time'] = datetime.now(timezone.utc).isoformat()
+            event_ts = self._parse_event_time(event_dict)
+
+            writer = self._get_writer()
+            # _write_lock keeps seq numbers, file order and _recent in step.
+            # The writer thread only takes _lock, so blocking on a full
+            # writer queue here can't deadlock with its flush callback.
+            with self._write_lock:
+                self._last_seq += 1
+                event_dict['seq'] = self._last_seq
+                line = (json.dumps(event_dict) + '\n').encode('utf-8')
+                writer.write(line, (event_ts, self._last_seq, event_dict))
+
+                with self._lock:
+                    self._recent.append(event_dict)
+                    if event_ts is not None:
+                        self._insert_event(event_ts, event_dict)
+            return event_dict
         except Exception as e:
             print(f"Error writing to log file '{self.log_file}': {e}")
             return False
-    
-    def get_events(self, filter_time=None):
+
+    @property
+    def last_seq(self):
+        """Sequence number of the most recently logged event."""
+        return self._last_seq
+
+    def get_events_after_seq(self, after_seq):
+        """
+        Get events logged after the given sequence number, oldest first.
+
+        Returns:
+            List of event dictionaries, or None if some of those events are
+            no longer held in memory, or after_seq is ahead of this log (it
+            was reset), and the caller should reload instead
+        """
+        with self._lock:
+            if after_seq > self._last_seq:
+                return None
+            if after_seq == self._last_seq:
+                return []
+            first_seq = self._recent[0]['seq'] if self._recent else self._last_seq + 1
+            if after_seq < first_seq - 1:
+                return None
+            return list(islice(self._recent, after_seq - first_seq + 1, None))
+
+    def flush(self):
+        """
+        Wait until every logged event has been written to the log file.
+
+        Returns:
+            False if a write failed or events had to be dropped, else True
+        """
+        if self._writer:
+            return self._writer.flush()
+        return True
+
+    def close(self):
+        """Drain the batched writer, finish segment compression and persist the sidecar index and stats."""
+        if self._writer:
+            self._writer.close()
+        for thread in self._compress_threads:
+            thread.join(timeout=10)
+        with self._lock:
+            if self._unsaved_index_events:
+                self._save_index()
+            else:
+                self._save_seq()
+            if self._rollups.last_seq:
+                self._save_stats()
+
+    def get_stats(self, interval=None, since=None, until=None, fields=None):
         """
-        Get events from the log file.
-        
+        Event counts per time bucket from the pre-aggregated rollups, without reading the log.
+
         Args:
-            filter_time: Optional datetime object to filter events after this time
-            
+            interval: 'second', 'minute' or 'hour' (None picks one for the range)
+            since: Optional datetime; start of the range (default: a day before until)
+            until: Optional datetime; end of the range (default: now)
+            fields: Optional list of FILTER_FIELDS to break counts down by (default: all)
+
+        Returns:
+            Dictionary with 'interval', 'since', 'until', 'total' and 'buckets'
+
+        Raises:
+            ValueError: If interval or a field is unknown
+        """
+        return self._rollups.query(
+            interval,
+            since_ts=since.timestamp() if since else None,
+            until_ts=until.timestamp() if until else None,
+            fields=fields
+        )
+
+    def search(self, query, since=None, until=None, limit=DEFAULT_PAGE_SIZE, filters=None):
+        """
+        Full-text search: events whose message, client name/ID or any string
+        in event_info contain every word of the query, newest first.
+
+        Args:
+            query: Words to look for (case-insensitive, whole words)
+            since: Optional datetime; only events strictly after it
+            until: Optional datetime; only events at or before it
+            limit: Maximum number of events to return (capped at MAX_PAGE_SIZE)
+            filters: Optional {field: value or list of values} over FILTER_FIELDS
+
         Returns:
             List of event dictionaries
+
+        Raises:
+            RuntimeError: If the EventManager was created without search=True
+            ValueError: If filters names an unknown field
         """
-        display_events = []
-        try:
-            with open(self.log_file, 'r', encoding='utf-8') as f:
-                for line_num, line in enumerate(f):
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    try:
-                        event_data = json.loads(line)
-                        event_time_str = event_data.get('time')
-                        
-                        if not event_time_str:
-                            print(f"Warning: Log line {line_num+1} missing 'time' field. Skipping.")
-                            continue
-                        
-                        event_dt = None
-                        try:
-                            event_time_str = event_time_str.replace('Z', '+00:00')
-                            event_dt = datetime.fromisoformat(event_time_str)
-                            if event_dt.tzinfo is None:
-                                event_dt = event_dt.astimezone(timezone.utc)
-                        except ValueError:
-                            print(f"Warning: Log line {line_num+1} has invalid 'time' format: {event_time_str}. Skipping.")
-                            continue
-                        
-                        if filter_time and event_dt:
-                            if event_dt > filter_time:
-                                display_events.append(event_data)
-                        else:
-                            display_events.append(event_data)
-                            
-                    except json.JSONDecodeError:
-                        print(f"Warning: Invalid JSON on log line {line_num+1}. Skipping: {line[:100]}...")
-                    except Exception as e:
-                        print(f"Error processing log line {line_num+1}: {e}. Skipping.")
-        except FileNotFoundError:
-            print(f"Log file '{self.log_file}' not found. Creating a new file.")
-            Path(self.log_file).touch()
-        except Exception as e:
-            print(f"Error reading or processing log file '{self.log_file}': {e}")
-        
-        return display_events
\ No newline at end of file
+        if self._search is None:
+            raise RuntimeError("Search is not enabled for this event log")
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        filters = normalize_filters(filters)
+
+        # Make sure queued events are written and indexed first
+        self.flush()
+        while True:
+            with self._lock:
+                rotation = self._next_segment
+                hits = self._search.search(
+                    query,
+                    since_ts=since.timestamp() if since else None,
+                    until_ts=until.timestamp() if until else None,
+                    limit=None if filters else limit
+                )
+
+            results = self._read_search_hits(hits, limit, filters)
+            # Hits in the active log point into a segment after a rotation
+            if not self._rotated_since(rotation):
+                return results
+
+    def _read_search_hits(self, hits, limit, filters):
+        """
+        Read the matching lines a page at a time, one pass per file,
+        until limit of them pass the filters.
+        """
+        results = []
+        for start in range(0, len(hits), limit):
+            batch = hits[start:start + limit]
+            offsets_by_path = {}
+            for _, path, offset in batch:
+                offsets_by_path.setdefault(path, []).append(offset)
+            found = {path: read_events_at(path, offsets) for path, offsets in offsets_by_path.items()}
+            for _, path, offset in batch:
+                event_data = found[path].get(offset)
+                if event_data is not None and event_matches(event_data, filters):
+                    results.append(event_data)
+                    if len(results) >= limit:
+                        return results
+        return results
+
+    def get_events(self, filter_time=None, filters=None):
+        """
+        Get events from the in-memory event store, falling back to an
+        index-guided read of the log file for ranges older than the ring.
+
+        Args:
+            filter_time: Optional datetime object to filter events after this time
+            filters: Optional {field: value or list of values} over FILTER_FIELDS
+
+        Returns:
+            List of event dictionaries, oldest first
+
+        Raises:
+            ValueError: If filters names an unknown field
+        """
+        filters = normalize_filters(filters)
+        with self._lock:
+            if not filter_time:
+                if not filters:
+                    return list(self._events)
+                return [event_data for _, event_data in reversed(list(self._iter_ring(filters=filters)))]
+
+            filter_ts = filter_time.timestamp()
+            if filter_ts >= self._cache_floor:
+                if not filters:
+                    # Binary search for the first event strictly after filter_time
+                    start = bisect.bisect_right(self._event_keys, (filter_ts, float('inf')))
+                    return self._events[start:]
+                return [event_data for _, event_data in
+                        reversed(list(self._iter_ring(filter_ts, filters=filters)))]
+
+        # Older than the ring: make sure queued events are on disk first
+        self.flush()
+        return [event_data for _, event_data in self._read_events_range(filter_ts, filters=filters)]
+
+    def query_events(self, since=None, until=None, limit=DEFAULT_PAGE_SIZE, cursor=None, filters=None):
+        """
+        Get one page of events, newest first.
+
+        Args:
+            since: Optional datetime; only events strictly after it
+            until: Optional datetime; only events at or before it
+            limit: Maximum number of events to return (capped at MAX_PAGE_SIZE)
+            cursor: Opaque cursor from a previous page's next_cursor
+            filters: Optional {field: value or list of values} over FILTER_FIELDS
+
+        Returns:
+            Tuple of (list of event dictionaries, next_cursor or None)
+
+        Raises:
+            ValueError: If the cursor is malformed or filters names an unknown field
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        filters = normalize_filters(filters)
+        since_ts = since.timestamp() if since else None
+        upper_ts = until.timestamp() if until else None
+
+        after_cursor = None
+        if cursor:
+            after_cursor = decode_cursor(cursor)
+            upper_ts = after_cursor[0] if upper_ts is None else min(upper_ts, after_cursor[0])
+
+        def before_cursor(event_ts, event_data):
+            # Events sharing the cursor's time are ordered by seq, descending
+            if after_cursor is None or event_ts < after_cursor[0]:
+                return True
+            return event_ts == after_cursor[0] and event_data.get('seq', 0) < after_cursor[1]
+
+        # Collect one more than requested to know whether another page exists
+        page = []
+        with self._lock:
+            for event_ts, event_data in self._iter_ring(since_ts, upper_ts, filters):
+                if before_cursor(event_ts, event_data):
+                    page.append((event_ts, event_data))
+                    if len(page) > limit:
+                        break
+            cache_floor = self._cache_floor
+
+        # Continue into events older than the ring
+        if (len(page) <= limit and cache_floor > float('-inf') and
+                (since_ts is None or since_ts < cache_floor)):
+            self.flush()
+            disk_upper = cache_floor if upper_ts is None else min(upper_ts, cache_floor)
+            for event_ts, event_data in self._iter_older_events(since_ts, disk_upper, filters):
+                if before_cursor(event_ts, event_data):
+                    page.append((event_ts, event_data))
+                    if len(page) > limit:
+                        break
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            last_ts, last_event = page[-1]
+            next_cursor = encode_cursor(last_ts, last_event.get('seq', 0))
+
+        return [event_data for _, event_data in page], next_cursor
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+import bisect
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+# Rollup intervals and their width in seconds
+STATS_INTERVALS = {'second': 1, 'minute': 60, 'hour': 3600}
+# How much history each interval keeps, in seconds
+STATS_RETENTION = {'second': 3600, 'minute': 2 * 86400, 'hour': 400 * 86400}
+# Automatic interval choice: the finest one giving at most this many buckets
+STATS_MAX_BUCKETS = 1000
+# Range returned by a query without 'since' (seconds)
+STATS_DEFAULT_RANGE = 86400
+STATS_VERSION = 1
+
+class EventRollups:
+    """
+    Event counters pre-aggregated per second, minute and hour.
+
+    Each bucket holds the total number of events in it plus a count per
+    value of each counted field (client ID, priority, ...). Counts are
+    per field, not per combination of fields. Buckets older than the
+    interval's retention (relative to the newest event seen) are dropped.
+    """
+
+    def __init__(self, fields, intervals=STATS_INTERVALS, retention=STATS_RETENTION):
+        self.fields = tuple(fields)
+        self.intervals = dict(intervals)
+        self.retention = dict(retention)
+        # Highest 'seq' counted, so a restart knows where to continue
+        self.last_seq = 0
+        # interval -> bucket start -> {'total': n, field: {value: n}}
+        self._buckets = {name: {} for name in self.intervals}
+        # interval -> sorted bucket starts, for range lookups
+        self._starts = {name: [] for name in self.intervals}
+        self._newest = {name: None for name in self.intervals}
+        self._lock = threading.Lock()
+
+    def add(self, event_ts, values, count=1, seq=None, intervals=None):
+        """
+        Count events at a timestamp.
+
+        Args:
+            event_ts: Event time (UTC timestamp)
+            values: {field: value or None} for the counted fields
+            count: Number of events with these values
+            seq: The event's 'seq', if any
+            intervals: Only update these intervals (default: all)
+        """
+        with self._lock:
+            for name, width in self.intervals.items():
+                if intervals is not None and name not in intervals:
+                    continue
+                start = int(event_ts // width) * width
+                newest = self._newest[name]
+                if newest is not None and start <= newest - self.retention[name]:
+                    continue
+                bucket = self._buckets[name].get(start)
+                if bucket is None:
+                    bucket = self._buckets[name][start] = {'total': 0}
+                    bisect.insort(self._starts[name], start)
+                    if newest is None or start > newest:
+                        self._newest[name] = start
+                        self._prune(name)
+                bucket['total'] += count
+                for field in self.fields:
+                    value = values.get(field)
+                    if value is not None:
+                        counts = bucket.setdefault(field, {})
+                        counts[value] = counts.get(value, 0) + count
+            if seq is not None and seq > self.last_seq:
+                self.last_seq = seq
+
+    def _prune(self, name):
+        """Drop buckets that fell out of an interval's retention."""
+        starts = self._starts[name]
+        cut = bisect.bisect_right(starts, self._newest[name] - self.retention[name])
+        if cut:
+            buckets = self._buckets[name]
+            for start in starts[:cut]:
+                del buckets[start]
+            del starts[:cut]
+
+    def pick_interval(self, since_ts, until_ts):
+        """Finest interval that still holds since_ts and spans the range in at most STATS_MAX_BUCKETS buckets."""
+        by_width = sorted(self.intervals.items(), key=lambda item: item[1])
+        for name, width in by_width:
+            if (until_ts - since_ts) / width > STATS_MAX_BUCKETS:
+                continue
+            newest = self._newest[name]
+            if newest is not None and since_ts < newest - self.retention[name]:
+                continue
+            return name
+        return by_width[-1][0]
+
+    def query(self, interval=None, since_ts=None, until_ts=None, fields=None):
+        """
+        Counts per bucket overlapping a time range, oldest first. Empty buckets are left out.
+
+        Args:
+            interval: 'second', 'minute' or 'hour' (None picks one for the range)
+            since_ts: Start of the range (default: STATS_DEFAULT_RANGE before until_ts)
+            until_ts: End of the range (default: now)
+            fields: Counted fields to include per bucket (default: all)
+
+        Returns:
+            {'interval': name, 'since': iso, 'until': iso, 'total': n, 'buckets': [...]}
+            where each bucket is {'start': iso, 'ts': start, 'total': n, field: {value: n}}
+
+        Raises:
+            ValueError: If interval or a field is unknown
+        """
+        if until_ts is None:
+            until_ts = datetime.now(timezone.utc).timestamp()
+        if since_ts is None:
+            since_ts = until_ts - STATS_DEFAULT_RANGE
+        fields = self.fields if fields is None else tuple(fields)
+        for field in fields:
+            if field not in self.fields:
+                raise ValueError(f"Unknown stats field: {field}")
+
+        with self._lock:
+            if interval is None:
+                interval = self.pick_interval(since_ts, until_ts)
+            elif interval not in self.intervals:
+                raise ValueError(f"Unknown stats interval: {interval}")
+            width = self.intervals[interval]
+            starts = self._starts[interval]
+            buckets = self._buckets[interval]
+            # Buckets overlapping [since_ts, until_ts)
+            first = bisect.bisect_right(starts, since_ts - width)
+            last = bisect.bisect_left(starts, until_ts)
+            result = []
+            for start in starts[first:last]:
+                bucket = buckets[start]
+                entry = {
+                    'start': datetime.fromtimestamp(start, timezone.utc).isoformat(),
+                    'ts': start,
+                    'total': bucket['total'],
+                }
+                for field in fields:
+                    entry[field] = dict(bucket.get(field, {}))
+                result.append(entry)
+
+        return {
+            'interval': interval,
+            'since': datetime.fromtimestamp(since_ts, timezone.utc).isoformat(),
+            'until': datetime.fromtimestamp(until_ts, timezone.utc).isoformat(),
+            'total': sum(entry['total'] for entry in result),
+            'buckets': result,
+        }
+
+    def save(self, path):
+        """Atomically write the rollups to a JSON file."""
+        with self._lock:
+            data = {
+                'version': STATS_VERSION,
+                'fields': list(self.fields),
+                'last_seq': self.last_seq,
+                'intervals': {
+                    name: [[start, buckets[start]] for start in self._starts[name]]
+                    for name, buckets in self._buckets.items()
+                },
+            }
+            tmp_file = f"{path}.tmp"
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, separators=(',', ':'))
+                os.replace(tmp_file, path)
+            except OSError as e:
+                print(f"Warning: Could not write stats file '{path}': {e}")
+
+    def load(self, path):
+        """
+        Load rollups saved by save().
+
+        Returns:
+            True if they were loaded, False if the file is missing or unusable
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != STATS_VERSION or tuple(data.get('fields', ())) != self.fields:
+                print(f"Stats file '{path}' has a different format. Rebuilding.")
+                return False
+            buckets = {name: {} for name in self.intervals}
+            for name, entries in data['intervals'].items():
+                if name in buckets:
+                    buckets[name] = {int(start): bucket for start, bucket in entries}
+        except FileNotFoundError:
+            print(f"Stats file '{path}' not found. Building it from the log.")
+            return False
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Warning: Could not read stats file '{path}': {e}. Rebuilding.")
+            return False
+
+        with self._lock:
+            self._buckets = buckets
+            self._starts = {name: sorted(entries) for name, entries in buckets.items()}
+            self._newest = {name: starts[-1] if starts else None for name, starts in self._starts.items()}
+            self.last_seq = data.get('last_seq', 0)
+        return True
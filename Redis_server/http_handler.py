@@ -0,0 +1,449 @@
+#!/usr/bin/env python
+import gzip
+import json
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from event_manager import DEFAULT_PAGE_SIZE
+from static_cache import StaticAssetCache, parse_accept_encoding
+
+# Default cap on requests handled at the same time
+HTTP_MAX_CONCURRENT_REQUESTS = 32
+# Seconds an idle keep-alive connection is held open
+HTTP_KEEPALIVE_TIMEOUT = 5
+# Connections the OS queues for accept() before refusing or delaying more
+HTTP_LISTEN_BACKLOG = 128
+# Dynamic responses at least this big (bytes) are gzipped if the client accepts it
+HTTP_GZIP_MIN_SIZE = 1024
+# Favour speed over ratio: the dashboard markup is repetitive enough either way
+HTTP_GZIP_LEVEL = 5
+# Streamed responses are sent in chunks of about this many bytes
+HTTP_STREAM_CHUNK_SIZE = 16 * 1024
+
+# Filter query parameters and the event fields they filter on
+FILTER_PARAMS = {
+    'client_id': 'client_id',
+    'client_name': 'client_name',
+    'priority': 'priority',
+    'type': 'event_type',
+}
+
+def parse_filter_params(query_params):
+    """Collect filter query parameters into {param: [values]}. Values may repeat or be comma-separated."""
+    filter_params = {}
+    for param in FILTER_PARAMS:
+        values = [value.strip() for raw in query_params.get(param, [])
+                  for value in raw.split(',') if value.strip()]
+        if values:
+            filter_params[param] = values
+    return filter_params
+
+def filters_from_params(filter_params):
+    """EventManager filters for parsed filter parameters."""
+    return {FILTER_PARAMS[param]: values for param, values in filter_params.items()}
+
+def parse_time_param(value):
+    """Parse an ISO timestamp query parameter into an aware UTC datetime. Raises ValueError."""
+    value = value.replace('Z', '+00:00')
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.astimezone(timezone.utc)
+    return dt
+
+class PooledHTTPServer(ThreadingHTTPServer):
+    """
+    HTTPServer that serves at most max_workers requests at a time, so a
+    burst of slow queries can't pile up unbounded work.
+
+    Each connection gets its own (daemon) thread, and a request only takes
+    one of the max_workers slots from the moment its request line has been
+    read until its response is sent. Idle keep-alive connections therefore
+    never hold a slot; requests beyond max_workers wait for a free one.
+    """
+    daemon_threads = True
+    # Listen backlog; socketserver's default of 5 makes connects beyond it
+    # wait for SYN retransmits (1s, 3s, ...) when many dashboards open at once
+    request_queue_size = HTTP_LISTEN_BACKLOG
+
+    def __init__(self, server_address, handler_class, max_workers=HTTP_MAX_CONCURRENT_REQUESTS):
+        super().__init__(server_address, handler_class)
+        self.max_workers = max_workers
+        self.request_slots = threading.BoundedSemaphore(max_workers)
+
+class DashboardHTTPRequestHandler(BaseHTTPRequestHandler):
+    """Serves the dashboard page, the JSON events API and static files."""
+
+    # HTTP/1.1 keeps connections alive between requests; every response
+    # must therefore carry a Content-length
+    protocol_version = "HTTP/1.1"
+    timeout = HTTP_KEEPALIVE_TIMEOUT
+
+    # Set by the server before it starts serving. The TemplateHandler and
+    # EventManager are shared by every request thread, so whatever they
+    # cache persists across requests.
+    static_folder = "static"
+    page_size = DEFAULT_PAGE_SIZE  # Event cards per dashboard page
+    gzip_min_size = HTTP_GZIP_MIN_SIZE
+    template_handler = None
+    event_manager = None
+    static_assets = None
+
+    def parse_request(self):
+        """Parse the request, then wait for a request slot before it is handled."""
+        if not super().parse_request():
+            return False
+        slots = getattr(self.server, 'request_slots', None)
+        if slots is not None:
+            slots.acquire()
+            self._request_slot = slots
+        return True
+
+    def handle_one_request(self):
+        """Handle one request on the connection, releasing its slot afterwards."""
+        self._request_slot = None
+        try:
+            super().handle_one_request()
+        finally:
+            if self._request_slot is not None:
+                self._request_slot.release()
+                self._request_slot = None
+
+    @classmethod
+    def configure(cls, event_manager, template_handler, static_assets=None,
+                  static_folder=None, page_size=None, gzip_min_size=None):
+        """Attach the process-wide services all requests are served from."""
+        cls.event_manager = event_manager
+        cls.template_handler = template_handler
+        cls.static_folder = static_folder or template_handler.static_folder
+        cls.static_assets = static_assets or StaticAssetCache(cls.static_folder)
+        if page_size is not None:
+            cls.page_size = page_size
+        if gzip_min_size is not None:
+            cls.gzip_min_size = gzip_min_size
+
+    def do_GET(self):
+        start_time = time.time()
+        parsed_path = urlparse(self.path)
+        
+        # Handle static file requests
+        if parsed_path.path.startswith('/static/'):
+            self.serve_static_file(parsed_path.path[8:])  
+            return
+            
+        # Handle other known static files
+        if parsed_path.path == '/dashboard.js':
+            self.serve_static_file('dashboard.js')
+            return
+        if parsed_path.path == '/styles.css':
+            self.serve_static_file('styles.css')
+            return
+        
+        # Handle the JSON events API
+        if parsed_path.path == '/api/events':
+            self.serve_events_api(parse_qs(parsed_path.query))
+            return
+        if parsed_path.path == '/api/search':
+            self.serve_search_api(parse_qs(parsed_path.query))
+            return
+        if parsed_path.path == '/api/stats':
+            self.serve_stats_api(parse_qs(parsed_path.query))
+            return
+        
+        # Handle the main dashboard request
+        if parsed_path.path == '/' or parsed_path.path == '/index.html':
+            query_params = parse_qs(parsed_path.query)
+            
+            # Process filtering logic
+            show_since_str = query_params.get('show_since', [None])[0]
+            show_since_dt = None
+            
+            if show_since_str:
+                try:
+                    show_since_dt = parse_time_param(show_since_str)
+                    print(f"Filtering events since: {show_since_dt}")
+                except ValueError:
+                    print(f"Warning: Invalid 'show_since' timestamp format: {show_since_str}. Showing all events.")
+                    show_since_dt = None
+            
+            # Client, priority and event type filters
+            filter_params = parse_filter_params(query_params)
+            filters = filters_from_params(filter_params)
+            
+            # Full-text search shows the best page of matches, without paging
+            search_query = query_params.get('q', [''])[0].strip()
+            events = None
+            next_cursor = None
+            if search_query:
+                try:
+                    events = self.event_manager.search(
+                        search_query, since=show_since_dt, limit=self.page_size, filters=filters
+                    )
+                except RuntimeError as e:
+                    print(f"Warning: {e}. Ignoring search '{search_query}'.")
+                    search_query = ''
+            
+            # Get the requested page of filtered events, newest first
+            if events is None:
+                cursor = query_params.get('cursor', [None])[0]
+                try:
+                    events, next_cursor = self.event_manager.query_events(
+                        since=show_since_dt, limit=self.page_size, cursor=cursor, filters=filters
+                    )
+                except ValueError:
+                    print(f"Warning: Invalid 'cursor': {cursor}. Showing the newest events.")
+                    events, next_cursor = self.event_manager.query_events(
+                        since=show_since_dt, limit=self.page_size, filters=filters
+                    )
+            
+            # Stream the HTML response as it renders
+            html_chunks = self.template_handler.iter_dashboard(
+                events, show_since_dt, last_seq=self.event_manager.last_seq,
+                next_cursor=next_cursor, filter_params=filter_params, search_query=search_query
+            )
+            self.send_stream((chunk.encode('utf-8') for chunk in html_chunks),
+                             'text/html; charset=utf-8')
+            
+            end_time = time.time()
+            print(f"HTTP Request processed in {end_time - start_time:.4f} seconds. Displayed {len(events)} events.")
+            return
+            
+        # If path not recognized, return 404
+        self.send_error(404)
+    
+    def serve_events_api(self, query_params):
+        """
+        Serve one page of events as JSON, newest first.
+
+        Query parameters:
+            limit: Page size (default 100, max 1000)
+            since: ISO timestamp, only events after it
+            until: ISO timestamp, only events at or before it
+            cursor: next_cursor from the previous page
+            client_id, client_name, priority, type: Only events with one of
+                these values (repeat the parameter or comma-separate values)
+        """
+        try:
+            limit = int(query_params.get('limit', [DEFAULT_PAGE_SIZE])[0])
+            if limit < 1:
+                raise ValueError("limit must be positive")
+            since = query_params.get('since', [None])[0]
+            until = query_params.get('until', [None])[0]
+            since_dt = parse_time_param(since) if since else None
+            until_dt = parse_time_param(until) if until else None
+            cursor = query_params.get('cursor', [None])[0]
+
+            filters = filters_from_params(parse_filter_params(query_params))
+
+            events, next_cursor = self.event_manager.query_events(
+                since=since_dt, until=until_dt, limit=limit, cursor=cursor, filters=filters
+            )
+        except ValueError as e:
+            self.send_error(400, f"Invalid query parameter: {e}")
+            return
+
+        body = json.dumps({
+            "events": events,
+            "count": len(events),
+            "next_cursor": next_cursor
+        }).encode('utf-8')
+
+        self.send_body(body, 'application/json')
+
+    def serve_search_api(self, query_params):
+        """
+        Serve full-text search results as JSON, newest first.
+
+        Query parameters:
+            q: Words that must all appear in the event (required)
+            limit: Maximum number of results (default 100, max 1000)
+            since: ISO timestamp, only events after it
+            until: ISO timestamp, only events at or before it
+            client_id, client_name, priority, type: Same filters as /api/events
+        """
+        query = query_params.get('q', [''])[0].strip()
+        if not query:
+            self.send_error(400, "Missing query parameter: q")
+            return
+        try:
+            limit = int(query_params.get('limit', [DEFAULT_PAGE_SIZE])[0])
+            if limit < 1:
+                raise ValueError("limit must be positive")
+            since = query_params.get('since', [None])[0]
+            until = query_params.get('until', [None])[0]
+            since_dt = parse_time_param(since) if since else None
+            until_dt = parse_time_param(until) if until else None
+
+            filters = filters_from_params(parse_filter_params(query_params))
+
+            events = self.event_manager.search(
+                query, since=since_dt, until=until_dt, limit=limit, filters=filters
+            )
+        except ValueError as e:
+            self.send_error(400, f"Invalid query parameter: {e}")
+            return
+        except RuntimeError as e:
+            self.send_error(501, str(e))
+            return
+
+        body = json.dumps({
+            "query": query,
+            "events": events,
+            "count": len(events)
+        }).encode('utf-8')
+
+        self.send_body(body, 'application/json')
+
+    def serve_stats_api(self, query_params):
+        """
+        Serve event counts per time bucket as JSON, from the pre-aggregated rollups.
+
+        Query parameters:
+            interval: second, minute or hour (default: picked from the range)
+            since: ISO timestamp, start of the range (default: a day before until)
+            until: ISO timestamp, end of the range (default: now)
+            by: Comma-separated breakdowns among client_id, client_name,
+                priority and type (default: all of them)
+        """
+        try:
+            interval = query_params.get('interval', [None])[0]
+            since = query_params.get('since', [None])[0]
+            until = query_params.get('until', [None])[0]
+            since_dt = parse_time_param(since) if since else None
+            until_dt = parse_time_param(until) if until else None
+
+            fields = None
+            if 'by' in query_params:
+                fields = []
+                for raw in query_params['by']:
+                    for param in filter(None, (value.strip() for value in raw.split(','))):
+                        if param not in FILTER_PARAMS:
+                            raise ValueError(f"unknown breakdown '{param}'")
+                        fields.append(FILTER_PARAMS[param])
+
+            stats = self.event_manager.get_stats(
+                interval=interval, since=since_dt, until=until_dt, fields=fields
+            )
+        except ValueError as e:
+            self.send_error(400, f"Invalid query parameter: {e}")
+            return
+
+        self.send_body(json.dumps(stats).encode('utf-8'), 'application/json')
+
+    def send_body(self, body, content_type):
+        """Send a 200 response, gzipped when it's big enough and the client accepts gzip."""
+        compress = (
+            len(body) >= self.gzip_min_size and
+            'gzip' in parse_accept_encoding(self.headers.get('Accept-Encoding'))
+        )
+        if compress:
+            body = gzip.compress(body, compresslevel=HTTP_GZIP_LEVEL)
+
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Content-length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self, chunks, content_type):
+        """
+        Send a 200 response from an iterable of byte strings as they are
+        produced, using chunked transfer encoding (gzipped on the fly if the
+        client accepts it). Responses that finish within the first chunk are
+        sent whole with send_body instead.
+        """
+        chunks = iter(chunks)
+        buffer = []
+        buffered = 0
+        for chunk in chunks:
+            buffer.append(chunk)
+            buffered += len(chunk)
+            if buffered >= HTTP_STREAM_CHUNK_SIZE:
+                break
+        else:
+            self.send_body(b''.join(buffer), content_type)
+            return
+
+        if self.request_version != 'HTTP/1.1':
+            # Chunked encoding is HTTP/1.1 only
+            buffer.extend(chunks)
+            self.send_body(b''.join(buffer), content_type)
+            return
+
+        compressor = None
+        if 'gzip' in parse_accept_encoding(self.headers.get('Accept-Encoding')):
+            # wbits=31 produces a gzip container rather than raw zlib
+            compressor = zlib.compressobj(HTTP_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        if compressor:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def write_chunk(data):
+            if compressor:
+                # Sync flush so the browser can start painting this chunk now
+                data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+        try:
+            write_chunk(b''.join(buffer))
+            buffer = []
+            buffered = 0
+            for chunk in chunks:
+                buffer.append(chunk)
+                buffered += len(chunk)
+                if buffered >= HTTP_STREAM_CHUNK_SIZE:
+                    write_chunk(b''.join(buffer))
+                    buffer = []
+                    buffered = 0
+            write_chunk(b''.join(buffer))
+            if compressor:
+                tail = compressor.flush()
+                if tail:
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(tail), tail))
+            self.wfile.write(b'0\r\n\r\n')
+        except Exception:
+            # Headers are already sent, so the only way to report a failure
+            # mid-stream is to drop the connection
+            self.close_connection = True
+            raise
+
+    def serve_static_file(self, filename):
+        """Serve a static file from the in-memory asset cache, honouring If-None-Match."""
+        asset = self.static_assets.get(filename) if self.static_assets else None
+        if asset is None:
+            self.send_error(404, f"File not found: {filename}")
+            return
+
+        encoding, content, etag = asset.select(self.headers.get('Accept-Encoding'))
+
+        # The browser's copy is still current, don't resend it
+        if asset.matches(self.headers.get('If-None-Match')):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', self.static_assets.cache_control)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-type', asset.content_type)
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-length', str(len(content)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', self.static_assets.cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        self.wfile.write(content)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+One-shot importer from JSON-lines event logs into the SQLite event store.
+
+With no file arguments it imports log_backups/*.bak, the sealed
+events.log.NNNNNN segments and events.log, oldest first. Re-running it is
+safe: unchanged files are skipped and events already stored are ignored.
+
+Usage:
+    python import_events.py --db events.db
+    python import_events.py --db events.db old_events.log other.bak
+"""
+import argparse
+import glob
+import os
+import re
+import time
+
+from sqlite_event_manager import SQLiteEventManager
+
+def default_log_files(log_file="events.log", backup_dir="log_backups"):
+    """Backups, then sealed segments, then the active log, in the order they were written."""
+    backups = sorted(glob.glob(os.path.join(backup_dir, "*.bak")))
+    pattern = re.compile(re.escape(os.path.basename(log_file)) + r'\.(\d+)(\.gz)?$')
+    directory = os.path.dirname(log_file) or '.'
+    segments = sorted(
+        (int(match.group(1)), os.path.join(directory, name))
+        for name in os.listdir(directory)
+        for match in [pattern.match(name)] if match
+    )
+    active = [log_file] if os.path.exists(log_file) else []
+    return backups + [path for _, path in segments] + active
+
+def main():
+    parser = argparse.ArgumentParser(description="Import event logs into the SQLite event store")
+    parser.add_argument('--db', default='events.db', help='SQLite database file')
+    parser.add_argument('--log-file', default='events.log', help='Active log (its segments are found next to it)')
+    parser.add_argument('--backup-dir', default='log_backups', help='Folder of *.bak log backups')
+    parser.add_argument('files', nargs='*', help='Log files to import instead of the defaults')
+    args = parser.parse_args()
+
+    files = args.files or default_log_files(args.log_file, args.backup_dir)
+    if not files:
+        print("No log files found to import.")
+        return
+
+    store = SQLiteEventManager(args.db)
+    start = time.perf_counter()
+    total = 0
+    for path in files:
+        try:
+            total += store.import_log_file(path)
+        except OSError as e:
+            print(f"Error importing '{path}': {e}")
+    print(f"Imported {total} event(s) from {len(files)} file(s) into '{args.db}' "
+          f"in {time.perf_counter() - start:.2f}s.")
+
+if __name__ == "__main__":
+    main()
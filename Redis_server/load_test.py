@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Simple HTTP load test for the dashboard server.
+
+Simulates a number of concurrent dashboards, each repeatedly fetching a URL
+over its own keep-alive connection, and reports latency percentiles.
+
+Browsers also keep extra keep-alive connections open without using them;
+--idle-connections opens that many and leaves them idle for the whole run.
+
+Usage:
+    python load_test.py --url http://localhost:8000/ --clients 50 --requests 20
+    python load_test.py --url http://localhost:8000/ --clients 50 --idle-connections 150
+"""
+import argparse
+import http.client
+import threading
+import time
+from urllib.parse import urlparse
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+def run_client(url, num_requests, latencies, errors, lock):
+    """One simulated dashboard: num_requests sequential GETs on one connection."""
+    parsed = urlparse(url)
+    path = parsed.path or '/'
+    if parsed.query:
+        path += '?' + parsed.query
+
+    conn = None
+    for _ in range(num_requests):
+        start = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+            conn.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                raise RuntimeError(f"HTTP {response.status}")
+            if response.getheader('Connection', '').lower() == 'close':
+                conn.close()
+                conn = None
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            if conn:
+                conn.close()
+            conn = None
+    if conn:
+        conn.close()
+
+def open_idle_connection(url):
+    """Open a keep-alive connection with one request on it, then leave it idle."""
+    parsed = urlparse(url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+    conn.request('GET', '/styles.css')
+    conn.getresponse().read()
+    return conn
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the monitoring dashboard HTTP server")
+    parser.add_argument('--url', default='http://localhost:8000/', help='URL to fetch')
+    parser.add_argument('--clients', type=int, default=50, help='Number of concurrent dashboards')
+    parser.add_argument('--requests', type=int, default=20, help='Requests per dashboard')
+    parser.add_argument('--idle-connections', type=int, default=0,
+                        help='Keep-alive connections held open but idle during the run')
+    args = parser.parse_args()
+
+    idle = [open_idle_connection(args.url) for _ in range(args.idle_connections)]
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_client, args=(args.url, args.requests, latencies, errors, lock))
+        for _ in range(args.clients)
+    ]
+
+    print(f"Load testing {args.url} with {args.clients} concurrent clients x {args.requests} requests...")
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"Completed: {len(latencies)} requests, {len(errors)} errors in {duration:.2f}s "
+          f"({len(latencies) / duration:.1f} req/s)")
+    if latencies:
+        print(f"Latency p50: {percentile(latencies, 50) * 1000:.1f} ms, "
+              f"p90: {percentile(latencies, 90) * 1000:.1f} ms, "
+              f"p99: {percentile(latencies, 99) * 1000:.1f} ms, "
+              f"max: {latencies[-1] * 1000:.1f} ms")
+    if errors:
+        print(f"First error: {errors[0]}")
+    for conn in idle:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+import os
+import queue
+import threading
+import time
+
+# Default batching and durability settings
+WRITER_BATCH_SIZE = 500         # Flush once this many lines are queued
+WRITER_FLUSH_INTERVAL = 0.05    # ...or once the oldest queued line is this old (seconds)
+WRITER_QUEUE_SIZE = 10000       # log_event blocks once this many lines are pending
+WRITER_MAX_UNWRITTEN = 100000   # Lines kept for retry while writes fail; the oldest are dropped beyond this
+FSYNC_POLICIES = ("none", "batch", "interval")
+FSYNC_INTERVAL = 1.0            # Seconds between fsyncs with the "interval" policy
+
+# Marker telling the writer thread to stop after draining the queue
+_STOP = object()
+
+class _FlushRequest(threading.Event):
+    """Queued by flush(); set once the lines before it were written or a write failed."""
+    written = False
+
+class BatchedLogWriter:
+    """
+    Appends log lines from a queue on a dedicated thread, group-committing
+    each batch with a single write.
+
+    on_flush(start_offset, entries) is called after every batch, where
+    entries is the list of (offset, line, context) written starting at
+    start_offset, so the caller can index what actually landed on disk.
+
+    Failed writes are retried. While they keep failing, at most max_unwritten
+    lines are held; older ones are dropped (and logged) beyond that.
+    """
+
+    def __init__(self, log_file, on_flush=None, batch_size=WRITER_BATCH_SIZE,
+                 flush_interval=WRITER_FLUSH_INTERVAL, fsync_policy="none",
+                 fsync_interval=FSYNC_INTERVAL, queue_size=WRITER_QUEUE_SIZE,
+                 max_unwritten=WRITER_MAX_UNWRITTEN):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy must be one of {FSYNC_POLICIES}, got '{fsync_policy}'")
+
+        self.log_file = log_file
+        self.on_flush = on_flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.max_unwritten = max_unwritten
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file = None
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
+        # Set when lines are dropped, cleared once flush() callers are told
+        self._dropped = False
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, line, context=None):
+        """Queue an encoded line (bytes ending in a newline) for writing."""
+        if not self._thread.is_alive():
+            raise RuntimeError(f"Log writer for '{self.log_file}' is closed")
+        self._queue.put((line, context))
+
+    def flush(self, timeout=None):
+        """
+        Block until everything queued so far has been written.
+
+        Returns:
+            True if it was written, False if a write failed (the lines are
+            still retried unless dropped), lines were dropped or it timed out
+        """
+        if not self._thread.is_alive():
+            return True
+        done = _FlushRequest()
+        self._queue.put(done)
+        return done.wait(timeout) and done.written
+
+    def close(self, timeout=10):
+        """Drain the queue, write and sync what's left, then stop the writer thread."""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def reopen(self):
+        """
+        Close the log file so the next batch opens it afresh, e.g. after it
+        has been renamed away. Only call this from the on_flush callback,
+        which runs on the writer thread.
+        """
+        if self._file:
+            if self._unsynced and self.fsync_policy != "none":
+                self._fsync()
+            self._file.close()
+            self._file = None
+
+    def _run(self):
+        """Writer thread: collect a batch, write it, repeat until stopped."""
+        pending = []
+        stopping = False
+
+        while not stopping:
+            # Wait for the first line of the next batch. With the interval
+            # policy, wake up while idle so written data still gets synced.
+            if pending:
+                # A previous write failed, retry it shortly
+                wait = self.flush_interval
+            elif self._unsynced and self.fsync_policy == "interval":
+                wait = self.fsync_interval
+            else:
+                wait = None
+            try:
+                item = self._queue.get(timeout=wait)
+            except queue.Empty:
+                if pending:
+                    pending = self._write_batch(pending)
+                self._maybe_fsync()
+                continue
+
+            waiters = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, _FlushRequest):
+                    waiters.append(item)
+                else:
+                    pending.append(item)
+
+                if stopping or waiters or len(pending) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if pending:
+                pending = self._drop_excess(self._write_batch(pending))
+            self._release(waiters, not pending)
+
+        # Anything still queued behind the stop marker is written too
+        waiters = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _FlushRequest):
+                waiters.append(item)
+            elif item is not _STOP:
+                pending.append(item)
+        if pending:
+            pending = self._write_batch(pending)
+            if pending:
+                print(f"Error: Dropping {len(pending)} event(s) that could not be written to "
+                      f"log file '{self.log_file}' before closing.")
+        self._release(waiters, not pending)
+
+        if self._file:
+            if self._unsynced and self.fsync_policy != "none":
+                self._fsync()
+            self._file.close()
+            self._file = None
+
+    def _drop_excess(self, pending):
+        """Drop the oldest unwritten lines beyond max_unwritten, logging them."""
+        excess = len(pending) - self.max_unwritten
+        if excess <= 0:
+            return pending
+        dropped = pending[:excess]
+        print(f"Error: Dropping {excess} event(s) that could not be written to log file "
+              f"'{self.log_file}'. First: {dropped[0][0][:200]!r}, last: {dropped[-1][0][:200]!r}")
+        self._dropped = True
+        return pending[excess:]
+
+    def _release(self, waiters, written):
+        """Wake flush() callers, telling them whether their lines were written."""
+        if not waiters:
+            return
+        for waiter in waiters:
+            waiter.written = written and not self._dropped
+            waiter.set()
+        self._dropped = False
+
+    def _write_batch(self, batch):
+        """Write a batch with a single write call. Returns the lines still unwritten."""
+        try:
+            if self._file is None:
+                self._file = open(self.log_file, 'ab')
+
+            # O_APPEND writes always land at the current end of the file,
+            # even if something else appended to or truncated it
+            start_offset = os.fstat(self._file.fileno()).st_size
+            entries = []
+            offset = start_offset
+            for line, context in batch:
+                entries.append((offset, line, context))
+                offset += len(line)
+
+            self._file.write(b''.join(line for line, _ in batch))
+            self._file.flush()
+            self._unsynced = True
+            if self.fsync_policy == "batch":
+                self._fsync()
+            else:
+                self._maybe_fsync()
+        except OSError as e:
+            print(f"Error writing {len(batch)} event(s) to log file '{self.log_file}': {e}. Will retry.")
+            if self._file:
+                self._file.close()
+                self._file = None
+            time.sleep(self.flush_interval)
+            return batch
+
+        if self.on_flush:
+            try:
+                self.on_flush(start_offset, entries)
+            except Exception as e:
+                print(f"Error in log writer flush callback: {e}")
+        return []
+
+    def _maybe_fsync(self):
+        """fsync if the interval policy says it's due."""
+        if (self.fsync_policy == "interval" and self._unsynced and
+                time.monotonic() - self._last_fsync >= self.fsync_interval):
+            self._fsync()
+
+    def _fsync(self):
+        try:
+            os.fsync(self._file.fileno())
+        except (OSError, AttributeError) as e:
+            print(f"Warning: fsync of log file '{self.log_file}' failed: {e}")
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
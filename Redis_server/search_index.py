@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+import bisect
+import gzip
+import json
+import math
+import os
+import re
+from array import array
+
+# Tokens are runs of letters and digits, lowercased
+TOKEN_RE = re.compile(r'[0-9a-z]+')
+MAX_TOKEN_LENGTH = 64
+# Cap on distinct tokens indexed per event (OSQuery tables can be large)
+MAX_TOKENS_PER_EVENT = 2000
+# Top-level event fields that are searched, besides every string in event_info
+SEARCH_FIELDS = ('message', 'client_name', 'client_id')
+# Events kept searchable; beyond this the oldest are dropped when the journal is compacted
+SEARCH_MAX_EVENTS = 2000000
+# Compact once the journal holds this much more than max_events (so it isn't rewritten on every save)
+COMPACT_SLACK = 0.25
+
+def _string_leaves(value):
+    """Yield every string nested anywhere in a JSON value."""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _string_leaves(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _string_leaves(item)
+
+def tokenize(text):
+    """Split text into lowercase search tokens."""
+    return [token for token in TOKEN_RE.findall(text.lower()) if len(token) <= MAX_TOKEN_LENGTH]
+
+def event_tokens(event_data):
+    """Distinct search tokens of an event: its message and names plus all strings in event_info."""
+    tokens = set()
+    for field in SEARCH_FIELDS:
+        value = event_data.get(field)
+        if isinstance(value, str):
+            tokens.update(tokenize(value))
+    for text in _string_leaves(event_data.get('event_info')):
+        tokens.update(tokenize(text))
+        if len(tokens) >= MAX_TOKENS_PER_EVENT:
+            break
+    return sorted(tokens)[:MAX_TOKENS_PER_EVENT]
+
+class SearchIndex:
+    """
+    Incremental inverted index from search tokens to event locations
+    (log file, byte offset).
+
+    Every change is appended to a journal file next to the log, so a
+    restart replays the journal instead of re-reading and re-tokenizing the
+    logs. Journal lines are JSON arrays:
+
+        ["F", file_id, path]                  a log file was registered
+        ["D", file_id, offset, end, ts, "tokens ..."]   an event was indexed
+        ["R", file_id, path or null]          a log file was renamed (or forgotten)
+        ["U", file_id, end]                   a log file is indexed up to end
+
+    Events of forgotten files and, beyond max_events, the oldest events are
+    dropped by rewriting the journal (see _compact).
+
+    Not thread-safe: callers serialize access (EventManager holds its lock).
+    """
+
+    def __init__(self, journal_file, max_events=SEARCH_MAX_EVENTS):
+        self.journal_file = journal_file
+        self.max_events = max_events
+        self._reset()
+        self._load()
+        if self._needs_compaction():
+            self._compact()
+
+    def _reset(self):
+        self._paths = []          # file id -> current path, or None if forgotten
+        self._file_ids = {}       # path -> file id
+        self._indexed_upto = []   # file id -> end offset of the last indexed event
+        self._last_doc = []       # file id -> doc id of the event ending there, or None
+        self._doc_counts = []     # file id -> number of events indexed
+        self._dead_docs = 0       # Events of forgotten files
+        self._doc_file = array('l')
+        self._doc_offset = array('q')
+        self._doc_ts = array('d')
+        self._postings = {}       # token -> array of doc ids, ascending
+        self._pending = []        # Journal lines not yet written
+
+    def _apply(self, entry):
+        """Apply one journal entry to the in-memory index."""
+        kind = entry[0]
+        if kind == "D":
+            _, file_id, offset, end, event_ts, tokens = entry
+            doc_id = len(self._doc_file)
+            self._doc_file.append(file_id)
+            self._doc_offset.append(offset)
+            self._doc_ts.append(event_ts if event_ts is not None else -math.inf)
+            self._doc_counts[file_id] += 1
+            if end >= self._indexed_upto[file_id]:
+                self._indexed_upto[file_id] = end
+                self._last_doc[file_id] = doc_id
+            for token in tokens.split():
+                postings = self._postings.get(token)
+                if postings is None:
+                    self._postings[token] = array('l', (doc_id,))
+                else:
+                    postings.append(doc_id)
+        elif kind == "F":
+            _, file_id, path = entry
+            if file_id != len(self._paths):
+                raise ValueError(f"unexpected file id {file_id}")
+            self._paths.append(path)
+            self._indexed_upto.append(0)
+            self._last_doc.append(None)
+            self._doc_counts.append(0)
+            self._file_ids[path] = file_id
+        elif kind == "R":
+            _, file_id, path = entry
+            old_path = self._paths[file_id]
+            if old_path is not None and self._file_ids.get(old_path) == file_id:
+                del self._file_ids[old_path]
+            if old_path is not None and path is None:
+                self._dead_docs += self._doc_counts[file_id]
+            self._paths[file_id] = path
+            if path is not None:
+                self._file_ids[path] = file_id
+        elif kind == "U":
+            _, file_id, end = entry
+            if end > self._indexed_upto[file_id]:
+                self._indexed_upto[file_id] = end
+                self._last_doc[file_id] = None
+        else:
+            raise ValueError(f"unknown entry type {kind!r}")
+
+    def _load(self):
+        """Replay the journal, cutting off anything after the first damaged line."""
+        good_upto = 0
+        try:
+            with open(self.journal_file, 'rb') as f:
+                for raw_line in f:
+                    if not raw_line.endswith(b'\n'):
+                        break
+                    try:
+                        self._apply(json.loads(raw_line))
+                    except (ValueError, TypeError, IndexError, KeyError) as e:
+                        print(f"Warning: Damaged search journal line at offset {good_upto}: {e}. Ignoring the rest.")
+                        break
+                    good_upto += len(raw_line)
+        except FileNotFoundError:
+            print(f"Search journal '{self.journal_file}' not found. Building the search index from the logs.")
+            return
+
+        if good_upto < os.path.getsize(self.journal_file):
+            # Drop the damaged tail so new entries append after good ones
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(good_upto)
+        print(f"Loaded search index: {len(self._doc_file)} event(s), {len(self._postings)} token(s).")
+
+    def _record(self, entry):
+        self._apply(entry)
+        self._pending.append(entry)
+
+    def save(self):
+        """Append the pending journal entries to the journal file, compacting it if it grew too large."""
+        if not self._pending:
+            return
+        data = "".join(json.dumps(entry, separators=(',', ':')) + "\n" for entry in self._pending)
+        try:
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                f.write(data)
+            self._pending = []
+        except OSError as e:
+            print(f"Warning: Could not write search journal '{self.journal_file}': {e}")
+            return
+        if self._needs_compaction():
+            self._compact()
+
+    def _needs_compaction(self):
+        """Whether the index holds well over max_events, or mostly events of forgotten files."""
+        total = len(self._doc_file)
+        return total > self.max_events * (1 + COMPACT_SLACK) or self._dead_docs > total // 2
+
+    def _compact(self):
+        """
+        Rewrite the journal with only the events still searchable: those of
+        files that weren't forgotten, and of those the newest max_events.
+        Each kept file also gets a "U" entry, so events dropped here aren't
+        indexed again. The in-memory index is then rebuilt from it.
+        """
+        live_ts = [event_ts for file_id, event_ts in zip(self._doc_file, self._doc_ts)
+                   if self._paths[file_id] is not None]
+        cutoff = -math.inf
+        if len(live_ts) > self.max_events:
+            live_ts.sort()
+            cutoff = live_ts[-self.max_events]
+
+        compact_file = f"{self.journal_file}.compact"
+        new_ids = {}
+        doc_id = 0
+        try:
+            with open(self.journal_file, 'rb') as src, open(compact_file, 'w', encoding='utf-8') as dst:
+                for raw_line in src:
+                    entry = json.loads(raw_line)
+                    kind = entry[0]
+                    if kind == "F":
+                        path = self._paths[entry[1]]
+                        if path is not None:
+                            new_ids[entry[1]] = len(new_ids)
+                            entry = ["F", new_ids[entry[1]], path]
+                        else:
+                            continue
+                    elif kind == "D":
+                        keep = entry[1] in new_ids and self._doc_ts[doc_id] >= cutoff
+                        doc_id += 1
+                        if not keep:
+                            continue
+                        entry[1] = new_ids[entry[1]]
+                    else:
+                        continue
+                    dst.write(json.dumps(entry, separators=(',', ':')) + "\n")
+                for file_id, new_id in new_ids.items():
+                    dst.write(json.dumps(["U", new_id, self._indexed_upto[file_id]]) + "\n")
+            os.replace(compact_file, self.journal_file)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not compact search journal '{self.journal_file}': {e}")
+            return
+
+        dropped = len(self._doc_file)
+        self._reset()
+        self._load()
+        dropped -= len(self._doc_file)
+        print(f"Compacted search index: dropped {dropped} event(s) of forgotten files or past "
+              f"the {self.max_events} event limit.")
+
+    def knows(self, path):
+        """Whether a log file has been registered under this path."""
+        return path in self._file_ids
+
+    def last_event(self, path):
+        """
+        (offset, end, timestamp) of the event a log file is indexed up to, or
+        None if it isn't known (timestamp is -inf for events without one).
+        """
+        file_id = self._file_ids.get(path)
+        if file_id is None or self._last_doc[file_id] is None:
+            return None
+        doc_id = self._last_doc[file_id]
+        return self._doc_offset[doc_id], self._indexed_upto[file_id], self._doc_ts[doc_id]
+
+    def indexed_upto(self, path):
+        """End offset of the last indexed event in a log file (0 if unknown)."""
+        file_id = self._file_ids.get(path)
+        return self._indexed_upto[file_id] if file_id is not None else 0
+
+    def add(self, path, offset, end, event_ts, event_data):
+        """Index an event stored at [offset, end) in the given log file."""
+        file_id = self._file_ids.get(path)
+        if file_id is None:
+            file_id = len(self._paths)
+            self._record(["F", file_id, path])
+        self._record(["D", file_id, offset, end, event_ts, " ".join(event_tokens(event_data))])
+
+    def rename(self, old_path, new_path):
+        """Point events indexed under old_path at new_path (a rotated or compressed file)."""
+        file_id = self._file_ids.get(old_path)
+        if file_id is not None:
+            self._record(["R", file_id, new_path])
+
+    def forget(self, path):
+        """Stop returning events from a file that was truncated or replaced."""
+        self.rename(path, None)
+
+    def search(self, query, since_ts=None, until_ts=None, limit=100):
+        """
+        Find events containing every token of the query, newest first.
+
+        Returns:
+            List of (timestamp, path, offset) for at most limit events
+            (all of them if limit is None)
+        """
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+        postings = sorted((self._postings.get(token, ()) for token in tokens), key=len)
+        if not postings[0]:
+            return []
+
+        # Walk the rarest token's postings, binary searching the others
+        others = postings[1:]
+        hits = []
+        for doc_id in postings[0]:
+            if not all(self._contains(other, doc_id) for other in others):
+                continue
+            event_ts = self._doc_ts[doc_id]
+            if since_ts is not None and not event_ts > since_ts:
+                continue
+            if until_ts is not None and event_ts > until_ts:
+                continue
+            path = self._paths[self._doc_file[doc_id]]
+            if path is not None:
+                hits.append((event_ts, doc_id, path))
+
+        hits.sort(reverse=True)
+        if limit is not None:
+            hits = hits[:limit]
+        return [(event_ts, path, self._doc_offset[doc_id]) for event_ts, doc_id, path in hits]
+
+    @staticmethod
+    def _contains(postings, doc_id):
+        index = bisect.bisect_left(postings, doc_id)
+        return index < len(postings) and postings[index] == doc_id
+
+def read_events_at(path, offsets):
+    """
+    Read the events starting at the given byte offsets of a log file.
+
+    Returns:
+        Dict of offset -> event dictionary (offsets that can't be read are left out)
+    """
+    events = {}
+    if not path.endswith('.gz') and not os.path.exists(path) and os.path.exists(f"{path}.gz"):
+        # Compressed since it was indexed
+        path = f"{path}.gz"
+    opener = gzip.open if path.endswith('.gz') else open
+    try:
+        with opener(path, 'rb') as f:
+            # Ascending offsets, so a gzip file is only decompressed once
+            for offset in sorted(set(offsets)):
+                f.seek(offset)
+                line = f.readline()
+                try:
+                    events[offset] = json.loads(line)
+                except ValueError:
+                    continue
+    except OSError as e:
+        print(f"Warning: Could not read search results from '{path}': {e}")
+    return events
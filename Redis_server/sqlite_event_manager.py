@@ -0,0 +1,467 @@
+#!/usr/bin/env python
+import gzip
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import atexit
+import time
+from collections import deque
+from datetime import datetime, timezone
+from itertools import islice
+
+from event_manager import (
+    parse_event_timestamp, encode_cursor, decode_cursor, event_field, normalize_filters,
+    RESUME_BUFFER_SIZE, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, FILTER_FIELDS
+)
+from event_stats import EventRollups
+from log_writer import WRITER_BATCH_SIZE, WRITER_FLUSH_INTERVAL, WRITER_QUEUE_SIZE
+from search_index import tokenize, event_tokens
+
+# Rows inserted per transaction by the importer
+IMPORT_BATCH_SIZE = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    seq INTEGER,                 -- NULL for events logged before seq numbers existed
+    ts REAL,                     -- event 'time' as a UTC timestamp, NULL if invalid
+    time TEXT,
+    server_time TEXT,
+    client_id TEXT,
+    client_name TEXT,
+    priority TEXT,
+    event_type TEXT,
+    event TEXT NOT NULL,         -- the full event as JSON
+    event_hash BLOB NOT NULL     -- SHA-1 of event; the same event is only stored once
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_events_hash ON events (event_hash);
+CREATE INDEX IF NOT EXISTS idx_events_seq ON events (seq);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts, seq);
+CREATE INDEX IF NOT EXISTS idx_events_server_time ON events (server_time);
+CREATE INDEX IF NOT EXISTS idx_events_client_id ON events (client_id, ts);
+CREATE INDEX IF NOT EXISTS idx_events_client_name ON events (client_name, ts);
+CREATE INDEX IF NOT EXISTS idx_events_priority ON events (priority, ts);
+CREATE INDEX IF NOT EXISTS idx_events_type ON events (event_type, ts);
+
+CREATE TABLE IF NOT EXISTS imported_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    events INTEGER
+);
+"""
+
+INSERT_SQL = """
+INSERT OR IGNORE INTO events
+    (seq, ts, time, server_time, client_id, client_name, priority, event_type, event, event_hash)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Marker telling the writer thread to stop after draining the queue
+_STOP = object()
+
+def event_row(event_data):
+    """Column values for INSERT_SQL from an event dictionary."""
+    try:
+        event_ts = parse_event_timestamp(event_data['time'])
+    except (KeyError, ValueError, AttributeError, TypeError):
+        event_ts = None
+    seq = event_data.get('seq')
+    event_json = json.dumps(event_data)
+    # Filter columns hold the same normalized values event_matches compares
+    return (
+        seq if isinstance(seq, int) else None,
+        event_ts,
+        event_data.get('time'),
+        event_data.get('server_time'),
+        event_field(event_data, 'client_id'),
+        event_field(event_data, 'client_name'),
+        event_field(event_data, 'priority'),
+        event_field(event_data, 'event_type'),
+        event_json,
+        event_hash(event_json)
+    )
+
+def event_hash(event_json):
+    """Deduplication key of an event's stored JSON."""
+    return hashlib.sha1(event_json.encode('utf-8')).digest()
+
+def filter_conditions(filters):
+    """SQL conditions and parameters for normalized filters."""
+    conditions = []
+    params = []
+    for field, values in filters.items():
+        values = sorted(values)
+        conditions.append(f"{field} IN ({', '.join('?' * len(values))})")
+        params.extend(values)
+    return conditions, params
+
+class SQLiteEventManager:
+    """
+    Event store backed by SQLite in WAL mode, with the same interface as
+    EventManager. Events are inserted by a writer thread in one transaction
+    per batch, and queries run on per-thread read connections against
+    indexed columns instead of scanning a log file.
+    """
+
+    def __init__(self, db_file="events.db", writer_batch_size=WRITER_BATCH_SIZE,
+                 writer_flush_interval=WRITER_FLUSH_INTERVAL, fsync_policy="none"):
+        """Initialize with path to the database file."""
+        self.db_file = db_file
+        self.writer_batch_size = writer_batch_size
+        self.writer_flush_interval = writer_flush_interval
+        # WAL with synchronous=NORMAL only syncs at checkpoints; FULL syncs every commit
+        self.synchronous = "FULL" if fsync_policy == "batch" else "NORMAL"
+
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=RESUME_BUFFER_SIZE)
+
+        conn = self._connect()
+        with conn:
+            conn.executescript(SCHEMA)
+        row = conn.execute("SELECT MAX(seq) FROM events").fetchone()
+        self._last_seq = row[0] or 0
+
+        # Event counts per second/minute/hour, rebuilt from the table on startup
+        self._rollups = EventRollups(FILTER_FIELDS)
+        self._load_stats(conn)
+
+        # The writer thread is only started by the first log_event
+        self._queue = None
+        self._writer = None
+
+    def _connect(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            self._local.conn = conn
+        return conn
+
+    def _load_stats(self, conn):
+        """Fill the rollups with one GROUP BY query per interval over its retention window."""
+        newest_ts = conn.execute("SELECT MAX(ts) FROM events").fetchone()[0]
+        if newest_ts is None:
+            return
+        columns = ", ".join(FILTER_FIELDS)
+        for name, width in self._rollups.intervals.items():
+            sql = (f"SELECT CAST(ts / ? AS INTEGER) * ? AS bucket, {columns}, COUNT(*) FROM events "
+                   f"WHERE ts > ? GROUP BY bucket, {columns} ORDER BY bucket")
+            params = (width, width, newest_ts - self._rollups.retention[name] - width)
+            for bucket, *values, count in conn.execute(sql, params):
+                self._rollups.add(bucket, dict(zip(FILTER_FIELDS, values)), count=count, intervals=(name,))
+        self._rollups.last_seq = self._last_seq
+
+    def _get_writer(self):
+        """Start the writer thread on first use."""
+        if self._writer is None:
+            self._queue = queue.Queue(maxsize=WRITER_QUEUE_SIZE)
+            self._writer = threading.Thread(target=self._run_writer, name="sqlite-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+        return self._queue
+
+    def _run_writer(self):
+        """Writer thread: collect a batch of rows and insert it in one transaction."""
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            rows = []
+            waiters = []
+            deadline = time.monotonic() + self.writer_flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    rows.append(item)
+
+                if stopping or waiters or len(rows) >= self.writer_batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            while rows:
+                try:
+                    with conn:
+                        conn.executemany(INSERT_SQL, rows)
+                    rows = []
+                except sqlite3.Error as e:
+                    print(f"Error writing {len(rows)} event(s) to database '{self.db_file}': {e}. Will retry.")
+                    time.sleep(self.writer_flush_interval)
+            for waiter in waiters:
+                waiter.set()
+        conn.close()
+        self._local.conn = None
+
+    def log_event(self, event_data):
+        """
+        Log an event. The event is inserted into the database by the writer
+        thread shortly after; queries wait for pending inserts first.
+
+        Returns:
+            The logged event dictionary (with 'server_time' and 'seq' added),
+            or False if it could not be logged
+        """
+        try:
+            if isinstance(event_data, str):
+                event_dict = json.loads(event_data)
+            else:
+                event_dict = event_data
+            event_dict['server_time'] = datetime.now(timezone.utc).isoformat()
+
+            writer_queue = self._get_writer()
+            with self._write_lock:
+                self._last_seq += 1
+                event_dict['seq'] = self._last_seq
+                row = event_row(event_dict)
+                writer_queue.put(row)
+                with self._lock:
+                    self._recent.append(event_dict)
+                event_ts = row[1]
+                if event_ts is not None:
+                    # Filter columns come right after seq, ts, time and server_time
+                    self._rollups.add(event_ts, dict(zip(FILTER_FIELDS, row[4:8])), seq=self._last_seq)
+            return event_dict
+        except Exception as e:
+            print(f"Error writing to database '{self.db_file}': {e}")
+            return False
+
+    @property
+    def last_seq(self):
+        """Sequence number of the most recently logged event."""
+        return self._last_seq
+
+    def get_events_after_seq(self, after_seq):
+        """
+        Get events logged after the given sequence number, oldest first.
+
+        Returns:
+            List of event dictionaries, or None if some of those events are
+            no longer held in memory, or after_seq is ahead of this store,
+            and the caller should reload instead
+        """
+        with self._lock:
+            if after_seq > self._last_seq:
+                return None
+            if after_seq == self._last_seq:
+                return []
+            first_seq = self._recent[0]['seq'] if self._recent else self._last_seq + 1
+            if after_seq < first_seq - 1:
+                return None
+            return list(islice(self._recent, after_seq - first_seq + 1, None))
+
+    def flush(self):
+        """Wait until every logged event has been committed. Returns True, like EventManager.flush."""
+        if self._writer and self._writer.is_alive():
+            done = threading.Event()
+            self._queue.put(done)
+            done.wait()
+        return True
+
+    def close(self):
+        """Commit any queued events and stop the writer thread."""
+        if self._writer and self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join(timeout=10)
+
+    def get_events(self, filter_time=None, filters=None):
+        """
+        Get events from the database.
+
+        Args:
+            filter_time: Optional datetime object to filter events after this time
+            filters: Optional {field: value or list of values} over FILTER_FIELDS
+
+        Returns:
+            List of event dictionaries, oldest first
+
+        Raises:
+            ValueError: If filters names an unknown field
+        """
+        conditions, params = filter_conditions(normalize_filters(filters))
+        conditions.insert(0, "ts IS NOT NULL")
+        if filter_time:
+            conditions.append("ts > ?")
+            params.append(filter_time.timestamp())
+        self.flush()
+        sql = f"SELECT event FROM events WHERE {' AND '.join(conditions)} ORDER BY ts, COALESCE(seq, -id)"
+        return [json.loads(row[0]) for row in self._connect().execute(sql, params)]
+
+    def query_events(self, since=None, until=None, limit=DEFAULT_PAGE_SIZE, cursor=None, filters=None):
+        """
+        Get one page of events, newest first.
+
+        Args:
+            since: Optional datetime; only events strictly after it
+            until: Optional datetime; only events at or before it
+            limit: Maximum number of events to return (capped at MAX_PAGE_SIZE)
+            cursor: Opaque cursor from a previous page's next_cursor
+            filters: Optional {field: value or list of values} over FILTER_FIELDS
+
+        Returns:
+            Tuple of (list of event dictionaries, next_cursor or None)
+
+        Raises:
+            ValueError: If the cursor is malformed or filters names an unknown field
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        conditions, params = filter_conditions(normalize_filters(filters))
+        conditions.insert(0, "ts IS NOT NULL")
+        if since:
+            conditions.append("ts > ?")
+            params.append(since.timestamp())
+        if until:
+            conditions.append("ts <= ?")
+            params.append(until.timestamp())
+        if cursor:
+            cursor_ts, cursor_seq = decode_cursor(cursor)
+            # Events sharing the cursor's time are ordered by seq, descending.
+            # Events without a seq sort below them by -id, so they page too.
+            conditions.append("(ts < ? OR (ts = ? AND COALESCE(seq, -id) < ?))")
+            params.extend([cursor_ts, cursor_ts, cursor_seq])
+
+        # Fetch one more than requested to know whether another page exists
+        self.flush()
+        sql = (f"SELECT ts, COALESCE(seq, -id), event FROM events WHERE {' AND '.join(conditions)} "
+               "ORDER BY ts DESC, COALESCE(seq, -id) DESC LIMIT ?")
+        rows = self._connect().execute(sql, params + [limit + 1]).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_ts, last_key, _ = rows[-1]
+            next_cursor = encode_cursor(last_ts, last_key)
+        return [json.loads(event_json) for _, _, event_json in rows], next_cursor
+
+    def get_stats(self, interval=None, since=None, until=None, fields=None):
+        """Event counts per time bucket from the in-memory rollups; same as EventManager.get_stats."""
+        return self._rollups.query(
+            interval,
+            since_ts=since.timestamp() if since else None,
+            until_ts=until.timestamp() if until else None,
+            fields=fields
+        )
+
+    def search(self, query, since=None, until=None, limit=DEFAULT_PAGE_SIZE, filters=None):
+        """
+        Full-text search with the same matching as EventManager.search.
+
+        There is no inverted index here: candidate rows are narrowed with
+        LIKE on the stored JSON and then checked word by word, newest first.
+
+        Returns:
+            List of event dictionaries
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+        conditions, params = filter_conditions(normalize_filters(filters))
+        conditions.insert(0, "ts IS NOT NULL")
+        for token in sorted(tokens):
+            conditions.append("event LIKE ?")
+            params.append(f"%{token}%")
+        if since:
+            conditions.append("ts > ?")
+            params.append(since.timestamp())
+        if until:
+            conditions.append("ts <= ?")
+            params.append(until.timestamp())
+
+        self.flush()
+        sql = (f"SELECT event FROM events WHERE {' AND '.join(conditions)} "
+               "ORDER BY ts DESC, COALESCE(seq, -id) DESC")
+        results = []
+        for (event_json,) in self._connect().execute(sql, params):
+            event_data = json.loads(event_json)
+            if tokens.issubset(event_tokens(event_data)):
+                results.append(event_data)
+                if len(results) >= limit:
+                    break
+        return results
+
+    def import_log_file(self, path):
+        """
+        Import a JSON-lines event log (events.log, a sealed segment or a
+        log_backups/*.bak file). Files already imported with the same size
+        and mtime are skipped, and events already in the database (the same
+        JSON, whatever their seq) are ignored, so re-running an import is safe.
+
+        Returns:
+            Number of events imported
+        """
+        stat = os.stat(path)
+        conn = self._connect()
+        row = conn.execute("SELECT size, mtime FROM imported_files WHERE path = ?",
+                           (os.path.abspath(path),)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            print(f"Skipping '{path}': already imported.")
+            return 0
+
+        imported = 0
+        skipped = 0
+        batch = []
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    event_data = json.loads(line)
+                except json.JSONDecodeError:
+                    skipped += 1
+                    continue
+                if not isinstance(event_data, dict):
+                    skipped += 1
+                    continue
+                batch.append(event_row(event_data))
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    imported += self._import_batch(conn, batch)
+                    batch = []
+        if batch:
+            imported += self._import_batch(conn, batch)
+
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO imported_files VALUES (?, ?, ?, ?)",
+                         (os.path.abspath(path), stat.st_size, stat.st_mtime, imported))
+        with self._write_lock:
+            row = conn.execute("SELECT MAX(seq) FROM events").fetchone()
+            self._last_seq = max(self._last_seq, row[0] or 0)
+
+        print(f"Imported {imported} event(s) from '{path}'" +
+              (f", skipped {skipped} invalid line(s)." if skipped else "."))
+        return imported
+
+    def _import_batch(self, conn, rows):
+        """
+        Insert rows in one transaction and count the new ones into the
+        stats rollups, so /api/stats sees them without a restart.
+
+        Returns:
+            Number of rows that were new
+        """
+        inserted = []
+        with conn:
+            for row in rows:
+                if conn.execute(INSERT_SQL, row).rowcount:
+                    inserted.append(row)
+        for row in inserted:
+            if row[1] is not None:
+                self._rollups.add(row[1], dict(zip(FILTER_FIELDS, row[4:8])))
+        return len(inserted)
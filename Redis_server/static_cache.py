@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+import gzip
+import hashlib
+import os
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # Optional, assets are only precompressed with gzip
+
+# Defaults
+STATIC_GZIP_MIN_SIZE = 512     # Don't bother compressing smaller files (bytes)
+STATIC_CHECK_INTERVAL = 1.0    # Seconds between mtime checks of a cached file
+STATIC_CACHE_MAX_AGE = 60      # Cache-Control max-age sent to browsers (seconds)
+
+CONTENT_TYPES = {
+    '.html': 'text/html',
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+    '.json': 'application/json',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.svg': 'image/svg+xml',
+}
+
+# Types worth compressing; images are already compressed
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+def parse_accept_encoding(header):
+    """Return the set of content codings an Accept-Encoding header allows (q > 0)."""
+    accepted = set()
+    for item in (header or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(coding)
+    return accepted
+
+class StaticAsset:
+    """One static file held in memory, with precompressed variants and ETags."""
+
+    def __init__(self, content, content_type, mtime_ns, min_compress_size=STATIC_GZIP_MIN_SIZE):
+        self.content_type = content_type
+        self.mtime_ns = mtime_ns
+        self.checked = time.monotonic()
+
+        digest = hashlib.sha1(content).hexdigest()
+        # Each encoding is a different representation, so each gets its own strong ETag
+        self.variants = {'identity': (content, f'"{digest}"')}
+        if len(content) >= min_compress_size and content_type.startswith(COMPRESSIBLE_TYPES):
+            gzipped = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(gzipped) < len(content):
+                self.variants['gzip'] = (gzipped, f'"{digest}-gzip"')
+            if brotli is not None:
+                compressed = brotli.compress(content)
+                if len(compressed) < len(content):
+                    self.variants['br'] = (compressed, f'"{digest}-br"')
+        self.etags = {etag for _, etag in self.variants.values()}
+
+    def select(self, accept_encoding):
+        """Pick the smallest variant the client accepts. Returns (encoding, body, etag)."""
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and (encoding in accepted or '*' in accepted):
+                return (encoding,) + self.variants[encoding]
+        return ('identity',) + self.variants['identity']
+
+    def matches(self, if_none_match):
+        """Whether an If-None-Match header matches any representation of this asset."""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag == '*':
+                return True
+            # If-None-Match uses weak comparison
+            if tag.startswith('W/'):
+                tag = tag[2:]
+            if tag in self.etags:
+                return True
+        return False
+
+class StaticAssetCache:
+    """
+    Serves files from the static folder out of memory.
+
+    Everything in the folder is loaded and precompressed once at startup.
+    A cached file is re-read only when its mtime changes (checked at most
+    every STATIC_CHECK_INTERVAL seconds), and only files inside the folder
+    can ever be served.
+    """
+
+    def __init__(self, static_folder="static", min_compress_size=STATIC_GZIP_MIN_SIZE,
+                 max_age=STATIC_CACHE_MAX_AGE):
+        self.static_folder = os.path.abspath(static_folder)
+        self.min_compress_size = min_compress_size
+        self.cache_control = f"public, max-age={max_age}" if max_age > 0 else "no-cache"
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def preload(self):
+        """Load and compress every file in the static folder."""
+        count = 0
+        for root, _, files in os.walk(self.static_folder):
+            for name in files:
+                relative = os.path.relpath(os.path.join(root, name), self.static_folder)
+                if self.get(relative.replace(os.sep, '/')):
+                    count += 1
+        print(f"Preloaded {count} static file(s) from {self.static_folder}"
+              f" (brotli {'enabled' if brotli else 'not installed'})")
+
+    def _resolve(self, filename):
+        """Absolute path for a request filename, or None if it points outside the folder."""
+        path = os.path.abspath(os.path.join(self.static_folder, filename.lstrip('/')))
+        if os.path.commonpath([path, self.static_folder]) != self.static_folder:
+            return None
+        return path
+
+    def _load(self, path):
+        """Read a file into a StaticAsset. Returns None if it can't be read."""
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            with open(path, 'rb') as f:
+                content = f.read()
+        except OSError:
+            return None
+        ext = os.path.splitext(path)[1].lower()
+        content_type = CONTENT_TYPES.get(ext, 'application/octet-stream')
+        return StaticAsset(content, content_type, mtime_ns, self.min_compress_size)
+
+    def get(self, filename):
+        """Return the StaticAsset for a file in the static folder, or None if there is none."""
+        asset = self._assets.get(filename)
+        now = time.monotonic()
+        if asset and now - asset.checked < STATIC_CHECK_INTERVAL:
+            return asset
+
+        path = self._resolve(filename)
+        if path is None or not os.path.isfile(path):
+            if asset:
+                with self._lock:
+                    self._assets.pop(filename, None)
+            return None
+
+        with self._lock:
+            asset = self._assets.get(filename)
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                return None
+            if asset and asset.mtime_ns == mtime_ns:
+                asset.checked = now
+                return asset
+
+            asset = self._load(path)
+            if asset:
+                self._assets[filename] = asset
+            return asset
@@ -1,11 +1,19 @@
 import json
+import hashlib
+import html
+from collections import OrderedDict
 from datetime import datetime, timezone
-# import time
+import time
 import os
+import threading
+from string import Formatter
+from urllib.parse import urlencode
+
+from event_manager import event_cursor
 
 # Template for event cards
 EVENT_CARD_TEMPLATE = """
-<div class="event-card {priority}">
+<div class="event-card {priority}" data-seq="{seq}" data-cursor="{cursor}">
     <div class="event-header">
         <div class="event-title">{message}</div>
         <div class="event-time">
@@ -33,14 +41,80 @@ EVENT_CARD_TEMPLATE = """
 </div>
 """
 
+# Seconds between checks of a cached template's mtime
+TEMPLATE_CHECK_INTERVAL = 1.0
+# Memory cap for rendered event cards, in characters of HTML
+CARD_CACHE_MAX_CHARS = 32 * 1024 * 1024
+
+class CompiledTemplate:
+    """
+    A str.format template pre-split into literal chunks and named slots.
+
+    Rendering fills the slots and joins the pieces, so the template text
+    is parsed once instead of on every request.
+    """
+
+    _formatter = Formatter()
+
+    def __init__(self, text):
+        self.parts = []   # Literal chunks, with None where a slot goes
+        self.slots = []   # (index into parts, field name, conversion, format spec)
+        for literal, field_name, format_spec, conversion in self._formatter.parse(text):
+            if literal:
+                self.parts.append(literal)
+            if field_name is not None:
+                self.slots.append((len(self.parts), field_name, conversion, format_spec))
+                self.parts.append(None)
+
+    def _format_slot(self, slot, values):
+        _, name, conversion, format_spec = slot
+        value = values[name]
+        if conversion:
+            value = self._formatter.convert_field(value, conversion)
+        return format(value, format_spec) if format_spec else str(value)
+
+    def render(self, **values):
+        """Fill the slots from values (a missing slot raises KeyError, like str.format)."""
+        parts = list(self.parts)
+        for slot in self.slots:
+            parts[slot[0]] = self._format_slot(slot, values)
+        return "".join(parts)
+
+    def iter_render(self, streamed=(), **values):
+        """
+        Yield the rendered template piece by piece.
+
+        Slots named in streamed take an iterable of strings (e.g. a
+        generator of event cards) whose items are yielded one at a time.
+        """
+        slot_at = {slot[0]: slot for slot in self.slots}
+        for index, part in enumerate(self.parts):
+            if part is not None:
+                yield part
+                continue
+            slot = slot_at[index]
+            if slot[1] in streamed:
+                yield from values[slot[1]]
+            else:
+                yield self._format_slot(slot, values)
+
 class TemplateHandler:
     """Handles all templating and HTML generation for the dashboard."""
     
-    def __init__(self, static_folder="static"):
+    def __init__(self, static_folder="static", card_cache_max_chars=CARD_CACHE_MAX_CHARS):
         """Initialize with the path to static assets."""
         self.static_folder = static_folder
         # Ensure the static folder exists
         os.makedirs(static_folder, exist_ok=True)
+        # filename -> (mtime_ns, last checked, CompiledTemplate)
+        self._templates = {}
+        self._templates_lock = threading.Lock()
+        # Logged events never change, so their rendered cards are kept in an
+        # LRU cache keyed by event identity and capped by total size
+        self.card_cache_max_chars = card_cache_max_chars
+        self._card_cache = OrderedDict()
+        self._card_cache_chars = 0
+        self._card_cache_lock = threading.Lock()
     
     def read_static_file(self, filename):
         """Read a static file content."""
@@ -51,6 +125,36 @@ class TemplateHandler:
             print(f"Warning: Static file '{filename}' not found.")
             return ""
     
+    def get_template(self, filename):
+        """
+        Return the compiled template for a static file.
+
+        The file is only re-read and recompiled when its mtime changes, and
+        the mtime is checked at most every TEMPLATE_CHECK_INTERVAL seconds.
+        """
+        now = time.monotonic()
+        cached = self._templates.get(filename)
+        if cached and now - cached[1] < TEMPLATE_CHECK_INTERVAL:
+            return cached[2]
+
+        with self._templates_lock:
+            cached = self._templates.get(filename)
+            if cached and now - cached[1] < TEMPLATE_CHECK_INTERVAL:
+                return cached[2]
+
+            try:
+                mtime = os.stat(os.path.join(self.static_folder, filename)).st_mtime_ns
+            except OSError:
+                mtime = None
+            if cached and cached[0] == mtime:
+                compiled = cached[2]
+            else:
+                compiled = CompiledTemplate(self.read_static_file(filename))
+                if cached:
+                    print(f"Template '{filename}' changed, reloaded.")
+            self._templates[filename] = (mtime, now, compiled)
+            return compiled
+
     def format_date(self, timestamp_str):
         """Format a timestamp string to a readable date."""
         try:
@@ -63,156 +167,233 @@ class TemplateHandler:
             return "Unknown time"
     
     def generate_event_cards(self, events):
-        """Generate HTML for event cards from a list of event data."""
+        """Generate HTML for event cards from a list of event data, in the order given (newest first)."""
+        return "".join(self.iter_event_cards(events))
+
+    def iter_event_cards(self, events):
+        """Yield the HTML of each event card in the order given."""
         if not events:
-            return '<div class="no-events">No matching events found in the log.</div>'
-        
-        def get_event_time(event):
-            try:
-                # Check for server_time first
-                if 'server_time' in event:
-                    time_str = event.get('server_time', '').replace('Z', '+00:00')
-                    return datetime.fromisoformat(time_str)
-                # Fall back to client time if server_time not available
-                else:
-                    time_str = event.get('time', '').replace('Z', '+00:00')
-                    return datetime.fromisoformat(time_str)
-            except:
-                return datetime.min.replace(tzinfo=timezone.utc)
+            yield '<div class="no-events">No matching events found in the log.</div>'
+            return
+        for event in events:
+            yield self.render_event_card(event)
+    
+    def format_data_list(self, value):
+        """Format a list of dictionaries (e.g. OSQuery rows) as a table, or a list if the keys differ."""
+        # Check if all dictionaries have the same keys (to create a table)
+        if value and all(item.keys() == value[0].keys() for item in value):
+            keys = list(value[0].keys())
             
-        sorted_events = sorted(events, key=get_event_time, reverse=True)
-        event_cards = ""
+            parts = ['<div class="data-table-container">', '<table class="data-table"><thead><tr>']
+            # Create table headers
+            parts.extend(f'<th>{k}</th>' for k in keys)
+            parts.append('</tr></thead><tbody>')
+            
+            # Create table rows with values
+            for item in value:
+                parts.append('<tr>')
+                parts.extend(f'<td>{item.get(k, "")}</td>' for k in keys)
+                parts.append('</tr>')
+            
+            parts.append('</tbody></table></div>')
+        else:
+            # Fallback for lists of dictionaries with different structures
+            parts = ['<div class="data-list">']
+            for i, item in enumerate(value):
+                parts.append(f'<div class="data-item"><strong>Item {i+1}:</strong><br>')
+                parts.extend(f'<span class="data-key">{k}:</span> <span class="data-value">{v}</span><br>'
+                             for k, v in item.items())
+                parts.append('</div>')
+            parts.append('</div>')
+        
+        return "".join(parts)
+    
+    def _card_cache_key(self, event):
+        """
+        Content hash of an event. Not its seq: the SQLite store can hold
+        different imported events with the same seq.
+        """
+        return hashlib.sha1(json.dumps(event, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def render_event_card(self, event):
+        """Return the HTML card for a single event, rendering it only if it isn't cached."""
+        key = self._card_cache_key(event)
+        with self._card_cache_lock:
+            card = self._card_cache.get(key)
+            if card is not None:
+                self._card_cache.move_to_end(key)
+                return card
+
+        card = self._build_event_card(event)
+        if len(card) > self.card_cache_max_chars:
+            return card
+
+        with self._card_cache_lock:
+            if key not in self._card_cache:
+                self._card_cache[key] = card
+                self._card_cache_chars += len(card)
+                # Evict least recently used cards until back under the cap
+                while self._card_cache_chars > self.card_cache_max_chars:
+                    _, evicted = self._card_cache.popitem(last=False)
+                    self._card_cache_chars -= len(evicted)
+        return card
+
+    def _build_event_card(self, event):
+        """Render the HTML card for a single event."""
+        # Format client time - THIS SHOULD COME FROM event['time']
+        client_time = "Unknown time"
+        client_time_str = event.get('time', '').replace('Z', '+00:00')
         
-        for event in sorted_events:
-            # Format client time - THIS SHOULD COME FROM event['time']
+        try:
+            client_dt = datetime.fromisoformat(client_time_str)
+            if client_dt.tzinfo is None:
+                client_dt = client_dt.replace(tzinfo=timezone.utc)
+            client_time = client_dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] + " UTC"
+        except Exception as e:
+            print(f"Error formatting client time: {e}")
             client_time = "Unknown time"
-            client_time_str = event.get('time', '').replace('Z', '+00:00')
-            
+        
+        # Format server time - THIS SHOULD COME FROM event['server_time']
+        server_time = "Unknown time"
+        if 'server_time' in event:
             try:
-                client_dt = datetime.fromisoformat(client_time_str)
-                if client_dt.tzinfo is None:
-                    client_dt = client_dt.replace(tzinfo=timezone.utc)
-                client_time = client_dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] + " UTC"
-            except Exception as e:
-                print(f"Error formatting client time: {e}")
-                client_time = "Unknown time"
-            
-            # Format server time - THIS SHOULD COME FROM event['server_time']
-            server_time = "Unknown time"
-            if 'server_time' in event:
-                try:
-                    server_time_str = event.get('server_time', '').replace('Z', '+00:00')
-                    server_dt = datetime.fromisoformat(server_time_str)
+                server_time_str = event.get('server_time', '').replace('Z', '+00:00')
+                server_dt = datetime.fromisoformat(server_time_str)
+                
+                if server_dt.tzinfo is None:
+                    server_dt = server_dt.replace(tzinfo=timezone.utc)
                     
-                    if server_dt.tzinfo is None:
-                        server_dt = server_dt.replace(tzinfo=timezone.utc)
-                        
-                    server_time = server_dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] + " UTC"
-                    
-                    # Optionally add time difference detection here
-                    if 'client_dt' in locals() and server_dt:
-                        time_diff = abs((client_dt - server_dt).total_seconds() / 3600)
-                        if time_diff > 1:
-                            client_time = client_dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] + " IST"
-                except Exception as e:
-                    print(f"Error formatting server time: {e}")
-            
-            event_info_rows = ""
-            event_info = event.get('event_info', {})
-            event_type = event_info.get('type', 'N/A')
-            
-            if isinstance(event_info, dict):
-                details_to_show = {k: v for k, v in event_info.items() if k != 'type'}
-                if not details_to_show:
-                    event_info_rows = '<div class="field-value">No additional details.</div>'
-                else:
-                    for key, value in details_to_show.items():
-                        key_display = key.replace('_', ' ').capitalize()
-                        
-                        # Handle data fields specially when they contain list of dictionaries
-                        if key.lower() == 'data' and isinstance(value, list) and all(isinstance(item, dict) for item in value):
-                            # Check if all dictionaries have the same keys (to create a table)
-                            if value and all(item.keys() == value[0].keys() for item in value):
-                                # Create table header with keys
-                                keys = list(value[0].keys())
-                                
-                                formatted_data = '<div class="data-table-container">'
-                                formatted_data += '<table class="data-table"><thead><tr>'
-                                
-                                # Create table headers
-                                for k in keys:
-                                    formatted_data += f'<th>{k}</th>'
-                                formatted_data += '</tr></thead><tbody>'
-                                
-                                # Create table rows with values
-                                for item in value:
-                                    formatted_data += '<tr>'
-                                    for k in keys:
-                                        formatted_data += f'<td>{item.get(k, "")}</td>'
-                                    formatted_data += '</tr>'
-                                
-                                formatted_data += '</tbody></table></div>'
-                            else:
-                                # Fallback for lists of dictionaries with different structures
-                                formatted_data = '<div class="data-list">'
-                                for i, item in enumerate(value):
-                                    formatted_data += f'<div class="data-item"><strong>Item {i+1}:</strong><br>'
-                                    for k, v in item.items():
-                                        formatted_data += f'<span class="data-key">{k}:</span> <span class="data-value">{v}</span><br>'
-                                    formatted_data += '</div>'
-                                formatted_data += '</div>'
-                            
-                            event_info_rows += f'<div class="field-name">{key_display}:</div>'
-                            event_info_rows += f'<div class="field-value">{formatted_data}</div>'
-                        else:
-                            event_info_rows += f'<div class="field-name">{key_display}:</div>'
-                            event_info_rows += f'<div class="field-value">{value}</div>'
+                server_time = server_dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] + " UTC"
+                
+                # Optionally add time difference detection here
+                if 'client_dt' in locals() and server_dt:
+                    time_diff = abs((client_dt - server_dt).total_seconds() / 3600)
+                    if time_diff > 1:
+                        client_time = client_dt.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] + " IST"
+            except Exception as e:
+                print(f"Error formatting server time: {e}")
+        
+        event_info = event.get('event_info', {})
+        event_type = event_info.get('type', 'N/A')
+        
+        if isinstance(event_info, dict):
+            details_to_show = {k: v for k, v in event_info.items() if k != 'type'}
+            if not details_to_show:
+                event_info_rows = '<div class="field-value">No additional details.</div>'
             else:
-                event_info_rows = f'<div class="field-value">{str(event_info)}</div>'
-            
-            priority = event.get('priority', 'unknown').lower()
-            card = EVENT_CARD_TEMPLATE.format(
-                priority=priority, 
-                message=event.get('message', 'Unknown event message'),
-                client_time=client_time,
-                server_time=server_time,
-                client_name=event.get('client_name', 'Unknown client'),
-                client_id=event.get('client_id', 'Unknown ID'), 
-                event_type=event_type,
-                event_info_rows=event_info_rows
-            )
-            event_cards += card
+                rows = []
+                for key, value in details_to_show.items():
+                    key_display = key.replace('_', ' ').capitalize()
+                    
+                    # Handle data fields specially when they contain list of dictionaries
+                    if key.lower() == 'data' and isinstance(value, list) and all(isinstance(item, dict) for item in value):
+                        formatted_data = self.format_data_list(value)
+                    else:
+                        formatted_data = value
+                    rows.append(f'<div class="field-name">{key_display}:</div>')
+                    rows.append(f'<div class="field-value">{formatted_data}</div>')
+                event_info_rows = "".join(rows)
+        else:
+            event_info_rows = f'<div class="field-value">{str(event_info)}</div>'
         
-        return event_cards
+        priority = event.get('priority', 'unknown').lower()
+        return EVENT_CARD_TEMPLATE.format(
+            priority=priority, 
+            seq=event.get('seq', ''),
+            cursor=event_cursor(event),
+            message=event.get('message', 'Unknown event message'),
+            client_time=client_time,
+            server_time=server_time,
+            client_name=event.get('client_name', 'Unknown client'),
+            client_id=event.get('client_id', 'Unknown ID'), 
+            event_type=event_type,
+            event_info_rows=event_info_rows
+        )
     
-    def render_dashboard(self, events, show_since_dt=None):
-        """Render the complete dashboard HTML."""
-        # Read the base template
+    def render_dashboard(self, events, show_since_dt=None, last_seq=0, next_cursor=None, filter_params=None,
+                         search_query=''):
+        """
+        Render the complete dashboard HTML for one page of events (newest first).
+
+        last_seq is embedded in the page so dashboard.js can ask the
+        WebSocket server for only the events logged after it. next_cursor,
+        if set, becomes a "Load older events" link to the following page.
+        filter_params ({query parameter: [values]}) are shown in the filter
+        form and kept in the page's links. search_query, if set, marks the
+        events as search results.
+        """
+        return "".join(self.iter_dashboard(events, show_since_dt, last_seq, next_cursor, filter_params,
+                                           search_query))
+
+    def generate_filter_form(self, filter_params, show_since_dt=None, search_query=''):
+        """Generate the search box and client / priority / type filter form, filled in with the current values."""
+        fields = [
+            ('client_id', 'Client ID'),
+            ('client_name', 'Client Name'),
+            ('priority', 'Priority'),
+            ('type', 'Event Type'),
+        ]
+        parts = ['<form class="filter-form" method="get" action="/">']
+        parts.append(f'<label>Search: <input type="search" name="q" value="{html.escape(search_query, quote=True)}" placeholder="words in message or details"></label>')
+        for param, label in fields:
+            value = html.escape(", ".join(filter_params.get(param, [])), quote=True)
+            parts.append(f'<label>{label}: <input type="text" name="{param}" value="{value}" placeholder="any"></label>')
+        if show_since_dt:
+            parts.append(f'<input type="hidden" name="show_since" value="{html.escape(show_since_dt.isoformat(), quote=True)}">')
+        parts.append('<button type="submit" class="filter-btn">Filter</button>')
+        parts.append('</form>')
+        return "".join(parts)
+
+    def iter_dashboard(self, events, show_since_dt=None, last_seq=0, next_cursor=None, filter_params=None,
+                       search_query=''):
+        """
+        Yield the dashboard HTML in pieces: the page header, then each event
+        card as it is rendered, then the footer. Takes the same arguments as
+        render_dashboard.
+        """
+        # Get the base template (cached until index.html changes)
         try:
-            template = self.read_static_file("index.html")
+            template = self.get_template("index.html")
         except Exception as e:
             print(f"Error reading template: {e}")
-            template = "<html><body><h1>Error loading template</h1></body></html>"
+            template = CompiledTemplate("<html><body><h1>Error loading template</h1></body></html>")
         
-        # Generate event cards
-        event_cards = self.generate_event_cards(events)
+        filter_params = filter_params or {}
         
         # Generate filter info
         if show_since_dt:
-            filter_info_html = f'<div class="filter-info">Displaying events since {show_since_dt.strftime("%Y-%m-%d %H:%M:%S %Z")}.</div>'
+            filter_info = f'Displaying events since {show_since_dt.strftime("%Y-%m-%d %H:%M:%S %Z")}'
         else:
-            filter_info_html = '<div class="filter-info">Displaying all events.</div>'
+            filter_info = 'Displaying all events'
+        if search_query:
+            filter_info += f" matching '{search_query}'"
+        if filter_params:
+            filter_info += " with " + "; ".join(
+                f"{param.replace('_', ' ')} {', '.join(values)}" for param, values in filter_params.items()
+            )
+        filter_info_html = f'<div class="filter-info">{html.escape(filter_info)}.</div>'
+        
+        # Link to the next (older) page, keeping the current filters
+        pagination_html = ""
+        if next_cursor:
+            params = {'cursor': next_cursor}
+            if show_since_dt:
+                params['show_since'] = show_since_dt.isoformat()
+            params.update(filter_params)
+            pagination_html = f'<div class="pagination"><a href="/?{html.escape(urlencode(params, doseq=True))}" class="load-older-btn">Load older events</a></div>'
         
-        # Create the "from now" URL
+        # Create the "from now" URL, keeping the current filters
         current_time_iso = datetime.now(timezone.utc).isoformat()
-        from_now_url = f"/?show_since={current_time_iso}"
+        from_now_url = html.escape("/?" + urlencode(dict(show_since=current_time_iso, **filter_params), doseq=True))
         
-        # Render the template
-        html_content = template.format(
+        # Render the template, streaming the event cards
+        return template.iter_render(
+            streamed=('event_cards',),
             event_count=len(events),
-            event_cards=event_cards,
+            event_cards=self.iter_event_cards(events),
             from_now_url=from_now_url,
-            filter_info_html=filter_info_html
+            filter_info_html=filter_info_html,
+            filter_form_html=self.generate_filter_form(filter_params, show_since_dt, search_query),
+            last_seq=last_seq,
+            pagination_html=pagination_html
         )
-        
-        return html_content
\ No newline at end of file
@@ -2,6 +2,12 @@
 import asyncio
 import websockets
 import inspect
+import json
+
+# Default coalescing window for refresh broadcasts, in seconds
+BROADCAST_WINDOW = 0.25
+# Pushes with more new events than this fall back to a full page refresh
+MAX_PUSH_EVENTS = 100
 
 # Dictionary of connected clients
 connected_clients = set()
@@ -9,6 +15,21 @@ connected_clients = set()
 # Reference to the event loop for scheduling broadcasts
 websocket_loop = None
 
+# Hooks set by start_websocket_server:
+#   render_event(event) -> card HTML for an event
+#   events_after_seq(seq) -> events logged after seq, or None if unavailable
+render_event = None
+events_after_seq = None
+
+# Broadcast coalescing state, only touched from the event loop thread.
+# At most MAX_PUSH_EVENTS + 1 events are held; beyond that only the count
+# matters, since the push becomes a refresh anyway.
+broadcast_window = BROADCAST_WINDOW
+_pending_events = []
+_pending_count = 0
+_flush_handle = None
+_last_broadcast = float('-inf')
+
 async def handle_websocket(websocket, *args, **kwargs):
     """
     Universal WebSocket handler that adapts to different versions of the websockets library.
@@ -26,16 +47,11 @@ async def handle_websocket(websocket, *args, **kwargs):
     connected_clients.add(websocket)
     
     try:
-        # Keep the connection open
-        if hasattr(websocket, 'wait_closed'):
-            # Newer versions of websockets
-            await websocket.wait_closed()
-        else:
-            while True:
-                message = await websocket.recv()
-                if message == "ping":
-                    await websocket.send("pong")
-                await asyncio.sleep(1)
+        # Serve client messages until the connection closes
+        # (recv() raises ConnectionClosed in every websockets version)
+        while True:
+            message = await websocket.recv()
+            await handle_client_message(websocket, message)
     
     except websockets.exceptions.ConnectionClosedOK:
         print(f"WebSocket client connection closed normally: {client_addr}")
@@ -48,6 +64,53 @@ async def handle_websocket(websocket, *args, **kwargs):
             connected_clients.remove(websocket)
         print(f"WebSocket client disconnected: {client_addr}")
 
+async def handle_client_message(websocket, message):
+    """
+    Answer a message from a dashboard.
+
+    "ping" is answered with "pong". {"type": "resume", "after_seq": N} is
+    answered with the events logged after N, or with {"type": "resync"} if
+    they are no longer available and the dashboard should reload instead.
+    """
+    if message == "ping":
+        await websocket.send("pong")
+        return
+
+    try:
+        request = json.loads(message)
+    except (json.JSONDecodeError, TypeError):
+        print(f"Ignoring unrecognised WebSocket message: {str(message)[:100]}")
+        return
+
+    if not isinstance(request, dict) or request.get('type') != 'resume':
+        return
+
+    try:
+        after_seq = int(request.get('after_seq', 0))
+    except (TypeError, ValueError):
+        after_seq = 0
+
+    events = events_after_seq(after_seq) if events_after_seq else None
+    if events is None or len(events) > MAX_PUSH_EVENTS:
+        await websocket.send(json.dumps({"type": "resync"}))
+    elif events:
+        await websocket.send(build_events_message(events))
+
+def build_events_message(events):
+    """Build the JSON delta pushed to dashboards for a list of new events."""
+    return json.dumps({
+        "type": "events",
+        "last_seq": max((event.get('seq', 0) for event in events), default=0),
+        "events": [
+            {
+                "seq": event.get('seq'),
+                "event": event,
+                "html": render_event(event)
+            }
+            for event in events
+        ]
+    })
+
 async def broadcast_message(message="refresh"):
     """
     Broadcast a message to all connected WebSocket clients.
@@ -59,64 +122,95 @@ async def broadcast_message(message="refresh"):
         print("No connected clients to broadcast to")
         return
         
-    print(f"Broadcasting '{message}' to {len(connected_clients)} clients...")
+    print(f"Broadcasting '{message[:80]}' to {len(connected_clients)} clients...")
     
-    tasks = []
-    failed_clients = []
-    
-    for client in list(connected_clients):
+    clients = list(connected_clients)
+    results = await asyncio.gather(
+        *(client.send(message) for client in clients),
+        return_exceptions=True
+    )
+
+    # Drop clients whose send failed
+    for client, result in zip(clients, results):
+        if isinstance(result, Exception):
+            print(f"Failed to send to client: {result}")
+            connected_clients.discard(client)
+
+def _queue_event(event):
+    """
+    Record a new event and make sure a push is scheduled. Runs on the
+    event loop; pushes are at least broadcast_window seconds apart.
+    """
+    global _flush_handle, _pending_count
+
+    _pending_count += 1
+    if len(_pending_events) <= MAX_PUSH_EVENTS:
+        _pending_events.append(event)
+    if _flush_handle is not None:
+        # A push is already scheduled and will carry these events too
+        return
+
+    delay = max(0.0, _last_broadcast + broadcast_window - websocket_loop.time())
+    _flush_handle = websocket_loop.call_later(delay, _flush_events)
+
+def _flush_events():
+    """
+    Push everything logged since the last push in one message: the events
+    themselves when possible, otherwise a refresh with the number of events.
+    """
+    global _pending_events, _pending_count, _flush_handle, _last_broadcast
+
+    events = _pending_events
+    count = _pending_count
+    _pending_events = []
+    _pending_count = 0
+    _flush_handle = None
+    _last_broadcast = websocket_loop.time()
+
+    if not connected_clients:
+        return
+
+    if render_event and count <= MAX_PUSH_EVENTS and all(events):
         try:
-            tasks.append(client.send(message))
+            message = build_events_message(events)
         except Exception as e:
-            print(f"Error preparing to send to client: {e}")
-            failed_clients.append(client)
-    
-    # Remove clients that failed during task preparation
-    for failed in failed_clients:
-        if failed in connected_clients:
-            connected_clients.remove(failed)
-    
-    if not tasks:
-        print("No messages were sent - all clients may be disconnected")
+            print(f"Error rendering events for broadcast: {e}")
+            message = json.dumps({"type": "refresh", "new_events": count})
+    else:
+        message = json.dumps({"type": "refresh", "new_events": count})
+    websocket_loop.create_task(broadcast_message(message))
+
+def queue_broadcast(events):
+    """
+    Queue newly logged events for the next coalesced push. Must be called
+    on the event loop itself; use schedule_broadcast from other threads.
+    """
+    if websocket_loop is None:
+        # Server not started yet, so there is nobody to push to
         return
-        
-    # Gather all sends
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    
-    # Check for any errors during sending
-    for i, result in enumerate(results):
-        if isinstance(result, Exception):
-            try:
-                # Get the client that caused the error
-                client = list(connected_clients)[i]
-                print(f"Failed to send to client: {result}")
-                connected_clients.remove(client)
-            except (IndexError, ValueError) as e:
-                print(f"Error tracking failed client: {e}")
+    for event in events:
+        _queue_event(event)
 
-def schedule_broadcast(message="refresh"):
+def schedule_broadcast(event=None):
     """
-    Schedule a broadcast on the event loop.
-    
+    Schedule a coalesced broadcast of a newly logged event on the event loop.
+    Safe to call from any thread; bursts within broadcast_window become a
+    single push.
+
     Args:
-        message: Message to broadcast, defaults to "refresh"
+        event: The logged event dictionary. Without it dashboards are just
+               told to refresh.
     """
-    global websocket_loop
-    
     if websocket_loop and websocket_loop.is_running():
         try:
-            # Schedule the coroutine on the event loop
-            future = asyncio.run_coroutine_threadsafe(
-                broadcast_message(message), 
-                websocket_loop
-            )
-            # result = future.result(timeout=1)
+            websocket_loop.call_soon_threadsafe(_queue_event, event)
         except Exception as e:
             print(f"Error scheduling broadcast: {e}")
     else:
         print("WebSocket loop not running, cannot schedule broadcast")
 
-async def start_websocket_server(host, port, loop=None):
+async def start_websocket_server(host, port, loop=None, window=BROADCAST_WINDOW,
+                                 event_renderer=None, event_source=None):
     """
     Start the WebSocket server with compatibility for different websockets versions.
     
@@ -124,14 +218,20 @@ async def start_websocket_server(host, port, loop=None):
         host: Hostname to bind to
         port: Port to listen on
         loop: Optional event loop to use
+        window: Minimum seconds between broadcasts
+        event_renderer: Callable returning the card HTML for an event
+        event_source: Callable returning the events logged after a seq number
     
     Returns:
         The WebSocket server object
     """
-    global websocket_loop
+    global websocket_loop, broadcast_window, render_event, events_after_seq
     
     # Store the event loop for later use
     websocket_loop = loop or asyncio.get_running_loop()
+    broadcast_window = window
+    render_event = event_renderer
+    events_after_seq = event_source
     
     print(f"Starting WebSocket server on ws://{host}:{port}")
     
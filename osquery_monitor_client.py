@@ -6,6 +6,7 @@ import redis
 import socket
 import uuid
 import threading
+import queue
 from datetime import datetime
 import osquery
 
@@ -16,11 +17,22 @@ REDIS_HOST = 'localhost'  # Remote Redis server IP (or brokers ip)
 REDIS_PORT = 6379
 HIGH_PRIORITY_QUEUE = 'monitoring:high'
 LOW_PRIORITY_QUEUE = 'monitoring:low'
+NOTIFICATION_MODE = "queue"  # "queue" (LPUSH + PUBLISH) or "stream" (XADD, see INGEST_MODE on the server)
+EVENT_STREAM = 'monitoring:events'
+STREAM_MAXLEN = 1000000  # Older stream entries are trimmed (approximately) beyond this many
+SEND_QUEUE_SIZE = 10000  # Events buffered in memory while the sender thread catches up
+SEND_BATCH_SIZE = 100  # Most events sent in one pipelined round trip
+SEND_BATCH_DELAY = 0.05  # Most seconds an event waits for its batch to fill
+SEND_QUEUE_FULL_POLICY = "drop"  # "drop" new events or "block" the monitoring task while the queue is full
+SPOOL_MAX_SIZE = 50 * 1024 * 1024  # Bytes of unsent events kept on disk while Redis is unreachable
+SPOOL_RETRY_INTERVAL = 5  # Seconds between attempts to reach Redis while events are spooled
 
 #############################################################
 # CLIENT CUSTOMIZATION - CHANGE THESE SETTINGS
 #############################################################
 CLIENT_NAME = "OSQueryTableMonitor"  # Change this to identify your client
+LOG_LEVEL = "info"  # "debug" also prints every outgoing JSON message
+SPOOL_FILE = f"{CLIENT_NAME}.spool"  # Events wait here (one JSON per line) while Redis is down
 
 #############################################################
 # OSQUERY TABLE CONFIGURATION - CUSTOMIZE THESE SETTINGS
@@ -189,9 +201,24 @@ class NotificationClient:
             decode_responses=True
         )
         
-        # Test connection
-        self.redis_client.ping()
-        print(f"Successfully connected to Redis at {REDIS_HOST}:{REDIS_PORT}")
+        # Test connection (events are spooled to disk until Redis is reachable)
+        try:
+            self.redis_client.ping()
+            self.connected = True
+            print(f"Successfully connected to Redis at {REDIS_HOST}:{REDIS_PORT}")
+        except redis.RedisError as e:
+            self.connected = False
+            print(f"Warning: Could not connect to Redis at {REDIS_HOST}:{REDIS_PORT} ({e}). "
+                  f"Notifications will be spooled to '{SPOOL_FILE}' until it is reachable.")
+        
+        # Monitoring tasks only queue events; this thread sends them in batches
+        self.send_queue = queue.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.dropped = 0
+        self.spool_size = self._load_spool()
+        self.spool_offset = 0  # Bytes of the spool file already replayed
+        self.next_retry = 0
+        self.sender_thread = threading.Thread(target=self._sender_loop, daemon=True)
+        self.sender_thread.start()
         
         # Send startup message
         self.send_notification(
@@ -207,7 +234,7 @@ class NotificationClient:
         )
     
     def send_notification(self, priority, message, event_info):
-        """Send a notification to the Redis server with the specified priority."""
+        """Queue a notification with the specified priority for the sender thread."""
         try:
             # Create the notification JSON with the required structure
             notification = {
@@ -223,41 +250,220 @@ class NotificationClient:
             json_data = json.dumps(notification)
             
             # Debug: Print the message info
-            if priority != "low" or event_info.get("type") != "osquery_table_data":
-                # Don't print low priority table data (too verbose)
-                print("\n----- SENDING JSON MESSAGE -----")
-                # Create a copy to modify for display
-                debug_notification = notification.copy()
-                if "data" in debug_notification.get("event_info", {}):
-                    # Replace data with count for display purposes
-                    debug_notification["event_info"]["data"] = f"[{len(debug_notification['event_info']['data'])} rows]"
-                print(json.dumps(debug_notification, indent=2))
-                print("-------------------------------\n")
-            else:
-                # For table data, print a simplified version
-                print(f"Sending {TABLE_NAME} data: {len(event_info.get('data', [])) or 0} rows")
-                
-                # Print a sample of the data (first row only)
-                if event_info.get('data') and len(event_info['data']) > 0:
-                    print("Sample row:")
-                    print(json.dumps(event_info['data'][0], indent=2))
-            
-            # Determine queue based on priority
-            if priority.lower() in ["high", "medium"]:
-                queue = HIGH_PRIORITY_QUEUE
-            else:
-                queue = LOW_PRIORITY_QUEUE
+            if LOG_LEVEL == "debug":
+                if priority != "low" or event_info.get("type") != "osquery_table_data":
+                    # Don't print low priority table data (too verbose)
+                    print("\n----- SENDING JSON MESSAGE -----")
+                    # Create a copy to modify for display
+                    debug_notification = notification.copy()
+                    if "data" in debug_notification.get("event_info", {}):
+                        # Replace data with count for display purposes (without touching the caller's dict)
+                        debug_notification["event_info"] = dict(
+                            event_info, data=f"[{len(event_info['data'])} rows]"
+                        )
+                    print(json.dumps(debug_notification, indent=2))
+                    print("-------------------------------\n")
+                else:
+                    # For table data, print a simplified version
+                    print(f"Sending {TABLE_NAME} data: {len(event_info.get('data', [])) or 0} rows")
+                    
+                    # Print a sample of the data (first row only)
+                    if event_info.get('data') and len(event_info['data']) > 0:
+                        print("Sample row:")
+                        print(json.dumps(event_info['data'][0], indent=2))
             
-            # Send to Redis
-            self.redis_client.lpush(queue, json_data)
-            
-            # Also publish for real-time notifications
-            self.redis_client.publish('monitoring:notifications', json_data)
-            
-            print(f"Sent {priority} priority notification: {message}")
+            self._enqueue((priority, message, json_data))
             
         except Exception as e:
-            print(f"Error sending notification: {e}")
+            print(f"Error queueing notification: {e}")
+    
+    def _enqueue(self, item):
+        """Hand an event to the sender thread, applying SEND_QUEUE_FULL_POLICY if the queue is full."""
+        if SEND_QUEUE_FULL_POLICY == "block":
+            self.send_queue.put(item)
+            return
+        try:
+            self.send_queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            print(f"Send queue full, dropped {item[0]} priority notification: {item[1]} "
+                  f"({self.dropped} dropped so far)")
+    
+    def _sender_loop(self):
+        """Send queued events in batches of up to SEND_BATCH_SIZE, waiting at most SEND_BATCH_DELAY for one to fill."""
+        stopping = False
+        while not stopping:
+            try:
+                # While events are spooled, wake up regularly to retry them
+                item = self.send_queue.get(timeout=SPOOL_RETRY_INTERVAL if self.spool_size else None)
+            except queue.Empty:
+                self._retry_spool()
+                continue
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + SEND_BATCH_DELAY
+            while len(batch) < SEND_BATCH_SIZE:
+                try:
+                    item = self.send_queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._deliver(batch)
+    
+    def _deliver(self, batch):
+        """Send a batch, or spool it behind any earlier events that are still waiting."""
+        if self.spool_size:
+            self._spool(batch)
+            self._retry_spool()
+        elif not self._send_batch(batch):
+            self._spool(batch)
+    
+    def _send_batch(self, batch):
+        """
+        Send a batch of (priority, message, json_data) events in one MULTI/EXEC round trip.
+        
+        Returns:
+            True if the batch was sent (or rejected by Redis and dropped),
+            False if Redis could not be reached
+        """
+        try:
+            pipe = self.redis_client.pipeline(transaction=True)
+            for priority, message, json_data in batch:
+                if NOTIFICATION_MODE == "stream":
+                    # Stays in the stream until a dashboard server acknowledges it
+                    pipe.xadd(EVENT_STREAM, {"data": json_data},
+                              maxlen=STREAM_MAXLEN, approximate=True)
+                else:
+                    # Determine queue based on priority
+                    if priority.lower() in ["high", "medium"]:
+                        queue_name = HIGH_PRIORITY_QUEUE
+                    else:
+                        queue_name = LOW_PRIORITY_QUEUE
+                    
+                    # Queue it and publish it for real-time notifications
+                    pipe.lpush(queue_name, json_data)
+                    pipe.publish('monitoring:notifications', json_data)
+            pipe.execute()
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            if self.connected:
+                print(f"Error sending {len(batch)} notification(s): {e}")
+                print(f"Spooling notifications to '{SPOOL_FILE}' until Redis is reachable.")
+            self.connected = False
+            return False
+        except Exception as e:
+            # Redis is up but refused the batch (e.g. WRONGTYPE, or XADD on an
+            # old server); retrying it would only hold up everything behind it
+            self.dropped += len(batch)
+            print(f"Error sending {len(batch)} notification(s), dropped them: {e}")
+            return True
+        
+        self.connected = True
+        for priority, message, _ in batch:
+            print(f"Sent {priority} priority notification: {message}")
+        return True
+    
+    def _load_spool(self):
+        """Size of the spool left by a previous run, dropping a partly written last line."""
+        try:
+            with open(SPOOL_FILE, 'r+b') as f:
+                data = f.read()
+                end = data.rfind(b'\n') + 1
+                if end < len(data):
+                    f.truncate(end)
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            print(f"Warning: Could not read spool file '{SPOOL_FILE}': {e}")
+            return 0
+        if end:
+            count = data.count(b'\n')
+            print(f"Found {count} spooled notification(s) in '{SPOOL_FILE}'. "
+                  f"They will be sent before new ones.")
+        return end
+    
+    def _spool(self, batch):
+        """Append events that could not be sent to the spool file, up to SPOOL_MAX_SIZE bytes."""
+        data = "".join(json_data + "\n" for _, _, json_data in batch).encode('utf-8')
+        if self.spool_size + len(data) > SPOOL_MAX_SIZE:
+            self.dropped += len(batch)
+            print(f"Spool file full, dropped {len(batch)} notification(s) ({self.dropped} dropped so far)")
+            return
+        try:
+            with open(SPOOL_FILE, 'ab') as f:
+                f.write(data)
+            self.spool_size += len(data)
+        except OSError as e:
+            self.dropped += len(batch)
+            print(f"Error writing spool file '{SPOOL_FILE}', dropped {len(batch)} notification(s): {e}")
+    
+    def _retry_spool(self):
+        """Replay the spool, at most once every SPOOL_RETRY_INTERVAL seconds while Redis is unreachable."""
+        if time.monotonic() < self.next_retry:
+            return
+        if not self._replay_spool():
+            self.next_retry = time.monotonic() + SPOOL_RETRY_INTERVAL
+    
+    def _replay_spool(self):
+        """
+        Send the spooled events in order, SEND_BATCH_SIZE per round trip, and
+        remove the spool file once all of them are sent. Events sent just
+        before the client is stopped mid-replay are sent again next time.
+        
+        Returns:
+            True if the spool is now empty
+        """
+        replayed = 0
+        try:
+            with open(SPOOL_FILE, 'rb') as f:
+                f.seek(self.spool_offset)
+                while True:
+                    lines = []
+                    while len(lines) < SEND_BATCH_SIZE:
+                        line = f.readline()
+                        if not line:
+                            break
+                        lines.append(line)
+                    if not lines:
+                        break
+                    
+                    batch = []
+                    for line in lines:
+                        json_data = line.decode('utf-8').rstrip('\n')
+                        try:
+                            notification = json.loads(json_data)
+                        except ValueError:
+                            continue
+                        batch.append((notification.get("priority", "low"), notification.get("message", ""), json_data))
+                    if batch and not self._send_batch(batch):
+                        return False
+                    self.spool_offset += sum(len(line) for line in lines)
+                    replayed += len(batch)
+            os.remove(SPOOL_FILE)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error replaying spool file '{SPOOL_FILE}': {e}")
+            return False
+        
+        self.spool_size = 0
+        self.spool_offset = 0
+        if replayed:
+            print(f"Replayed {replayed} spooled notification(s) from '{SPOOL_FILE}'")
+        return True
+    
+    def close(self, timeout=10):
+        """Send the events still queued and stop the sender thread."""
+        try:
+            self.send_queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.sender_thread.join(timeout)
+        if self.sender_thread.is_alive():
+            print(f"Warning: {self.send_queue.qsize()} notification(s) were not sent before shutdown")
     
     def start_monitoring(self):
         """Start the monitoring task."""
@@ -290,6 +496,7 @@ class NotificationClient:
                     }
                 )
                 
+                self.close()
                 print("Monitoring stopped.")
                 
         except Exception as e: